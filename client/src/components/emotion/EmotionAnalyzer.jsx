@@ -4,7 +4,7 @@ import GlassCard from '../layout/GlassCard';
 import CameraCapture from './CameraCapture';
 import PhotoUpload from './PhotoUpload';
 import { LOGO_SRC } from '../../constants/assets';
-import { analyzeEmotionBase64 } from '../../utils/api';
+import { analyzeEmotionFile, dataUrlToBlob } from '../../utils/api';
 import { useFlash } from '../flash/FlashContext';
 import { useCurrentUser } from '../../hooks/useAuth';
 import './EmotionAnalyzer.css';
@@ -67,7 +67,8 @@ const EmotionAnalyzer = () => {
 
       console.log('Enviando imagen al backend para análisis...');
       
-      const result = await analyzeEmotionBase64(photoData);
+      // Enviar la imagen como binario (multipart) en lugar de Base64 en JSON
+      const result = await analyzeEmotionFile(await dataUrlToBlob(photoData));
       
       console.log('✅ Resultado del análisis:', result);
       if (result && result.emotions_detected) {
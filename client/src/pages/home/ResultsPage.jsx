@@ -15,13 +15,18 @@ const ResultsPage = () => {
   const fetchRecommendations = useCallback(async () => {
     setLoading(true);
     try {
-      const protectedUrl = `http://127.0.0.1:8000/recommend?emotion=${result.emotion}`;
-      let response = await fetch(protectedUrl, { credentials: 'include' });
+      // Con el id del análisis y el token de la app el backend guarda las
+      // canciones en el historial (Spotify va en la cookie)
+      const appToken = localStorage.getItem('access_token');
+      const historyParam = result.analysis_id ? `&analysis_id=${result.analysis_id}` : '';
+      const historyHeaders = result.analysis_id && appToken ? { Authorization: `Bearer ${appToken}` } : {};
+      const protectedUrl = `http://127.0.0.1:8000/recommend?emotion=${result.emotion}${historyParam}`;
+      let response = await fetch(protectedUrl, { credentials: 'include', headers: historyHeaders });
 
       if (!response.ok) {
         // Fallback to mockup if protected endpoint fails
-        const fallbackUrl = `http://127.0.0.1:8000/recommend/mockup?emotion=${result.emotion}`;
-        response = await fetch(fallbackUrl);
+        const fallbackUrl = `http://127.0.0.1:8000/recommend/mockup?emotion=${result.emotion}${historyParam}`;
+        response = await fetch(fallbackUrl, { headers: historyHeaders });
       }
 
       if (response.ok) {
@@ -36,7 +41,7 @@ const ResultsPage = () => {
     } finally {
       setLoading(false);
     }
-  }, [result?.emotion]);
+  }, [result?.emotion, result?.analysis_id]);
 
   useEffect(() => {
     if (!result || !photo) {
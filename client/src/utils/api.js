@@ -245,6 +245,16 @@ export const analyzeEmotionBase64 = async (imageBase64) => {
   }
 };
 
+/**
+ * Convierte un data URL (cámara o FileReader) en Blob para enviarlo como archivo
+ * @param {string} dataUrl - data:image/...;base64,...
+ * @returns {Promise<Blob>}
+ */
+export const dataUrlToBlob = async (dataUrl) => {
+  const response = await fetch(dataUrl);
+  return response.blob();
+};
+
 /**
  * Enviar imagen como archivo (File/Blob) para análisis de emoción
  * @param {File|Blob} imageFile - Archivo de imagen
@@ -253,7 +263,8 @@ export const analyzeEmotionBase64 = async (imageBase64) => {
 export const analyzeEmotionFile = async (imageFile) => {
   try {
     const formData = new FormData();
-    formData.append('image', imageFile);
+    // Los Blob (p. ej. de la cámara) no tienen nombre; el backend solo mira el content-type
+    formData.append('image', imageFile, imageFile.name || 'photo.jpg');
 
     const url = `${getBaseUrl()}/v1/analysis/analyze`;
     const response = await fetchWithTimeout(url, {
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from server.api.v1.routes import auth, password_recovery, user, recommend, analysis, contact
+from server.api.v1.routes import auth, password_recovery, user, recommend, analysis, analysis_stream, contact, history
 
 router = APIRouter()
 
@@ -7,8 +7,10 @@ router.include_router(auth.router)
 router.include_router(user.router)
 router.include_router(recommend.router)
 router.include_router(analysis.router)
+router.include_router(analysis_stream.router)
 router.include_router(password_recovery.router)
 router.include_router(contact.router)   
+router.include_router(history.router)
 #router.include_router(analysis.router, prefix="/api/v1/analysis", tags=["Analysis"])
 #router.include_router(history.router, prefix="/api/v1/history", tags=["History"])
 #router.include_router(recommend.router, prefix="/api/v1/recommend", tags=["Recommend"])
@@ -1,16 +1,57 @@
-from fastapi import APIRouter, HTTPException, status, Header, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Header, UploadFile, File
 from pydantic import BaseModel
-from typing import Dict
-import random
-import base64
-import io
-from PIL import Image
-from server.services.aws_rekognition_service import rekognition_service
+from typing import Dict, List, Optional
+from datetime import datetime
 from server.core.config import settings
-from botocore.exceptions import BotoCoreError, ClientError
+from server.core.dependencies import CurrentUser, get_current_user, get_optional_user
+from server.services.emotion_analysis import (
+    MOCK_EMOTIONS,
+    EmotionAnalysisError,
+    aggregate_emotions,
+    analyze_image,
+    analyze_images,
+    aws_configured,
+    best_frame,
+    get_emotion_engine,
+    is_mock_result,
+    top_emotion,
+)
+from server.services.emotion_cache import cache_scope, emotion_cache
+from server.services.face_prefilter import face_prefilter
+from server.services.history_writer import history_writer
+from server.utils.image import (
+    ImageValidationError,
+    decode_base64_image,
+    read_upload,
+    validate_image_bytes,
+)
 
 router = APIRouter(prefix="/v1/analysis", tags=["analysis"])
 
+
+async def get_analysis_user(user: Optional[CurrentUser] = Depends(get_optional_user)) -> Optional[CurrentUser]:
+    """
+    Usuario de la request (si el token es válido); además separa la caché de
+    resultados por usuario
+    """
+    cache_scope.set(user.email if user else None)
+    return user
+
+
+def record_analysis(
+    user: Optional[CurrentUser],
+    emotion: Optional[str],
+    confidence: Optional[float],
+    results: List[Dict]
+) -> Optional[str]:
+    """
+    Agrega el resultado al historial del usuario (se escribe por lotes, fuera
+    de la request). Los resultados mockup no son del usuario: no se guardan.
+    """
+    if user is None or not emotion or any(is_mock_result(result) for result in results):
+        return None
+    return history_writer.record_analysis(user.id, emotion, confidence)
+
 class ImageBase64Request(BaseModel):
     image: str  # Base64 string
 
@@ -20,93 +61,48 @@ class EmotionAnalysisResponse(BaseModel):
     emotions_detected: Dict[str, float]
     timestamp: str
     message: str
+    bytes_saved: Optional[int] = None
+    cache_hit: Optional[bool] = None
+    face_confidence: Optional[float] = None
+    engine: Optional[str] = None
+    # Id en el historial; se pasa a /recommend para guardar las canciones
+    analysis_id: Optional[str] = None
+
+class BatchImageResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    result: Optional[EmotionAnalysisResponse] = None
+    error: Optional[str] = None
+    status_code: int = 200
 
-# 🎭 Datos mockup de emociones
-MOCK_EMOTIONS = {
-    "happy": {
-        "emotion": "happy",
-        "confidence": 0.87,
-        "emotions_detected": {
-            "happy": 0.87,
-            "relaxed": 0.06,
-            "sad": 0.03,
-            "angry": 0.02,
-            "energetic": 0.02
-        }
-    },
-    "sad": {
-        "emotion": "sad",
-        "confidence": 0.82,
-        "emotions_detected": {
-            "sad": 0.82,
-            "relaxed": 0.09,
-            "happy": 0.05,
-            "angry": 0.03,
-            "energetic": 0.01
-        }
-    },
-    "angry": {
-        "emotion": "angry",
-        "confidence": 0.79,
-        "emotions_detected": {
-            "angry": 0.79,
-            "energetic": 0.11,
-            "sad": 0.06,
-            "happy": 0.03,
-            "relaxed": 0.01
-        }
-    },
-    "relaxed": {
-        "emotion": "relaxed",
-        "confidence": 0.85,
-        "emotions_detected": {
-            "relaxed": 0.85,
-            "happy": 0.08,
-            "sad": 0.04,
-            "angry": 0.02,
-            "energetic": 0.01
-        }
-    },
-    "energetic": {
-        "emotion": "energetic",
-        "confidence": 0.83,
-        "emotions_detected": {
-            "energetic": 0.83,
-            "happy": 0.09,
-            "angry": 0.04,
-            "relaxed": 0.03,
-            "sad": 0.01
-        }
-    }
-}
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchImageResult]
+    emotion: Optional[str]
+    confidence: float
+    emotions_distribution: Dict[str, float]
+    best_index: Optional[int]
+    best: Optional[EmotionAnalysisResponse]
+    analyzed: int
+    failed: int
+    timestamp: str
+    analysis_id: Optional[str] = None
 
 def validate_image_base64(image_data: str) -> bool:
     """
     Valida que la imagen en base64 sea válida
     """
     try:
-        # Remover el prefijo data:image si existe
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Decodificar base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Intentar abrir como imagen
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Verificar que sea una imagen válida
-        image.verify()
-        
+        validate_image_bytes(decode_base64_image(image_data))
         return True
-    except Exception as e:
+    except ImageValidationError as e:
         print(f"❌ Error validando imagen: {e}")
         return False
 
 @router.post("/analyze-base64", response_model=EmotionAnalysisResponse, status_code=status.HTTP_200_OK)
 async def analyze_emotion_base64(
     request: ImageBase64Request,
-    authorization: str = Header(..., alias="Authorization")
+    authorization: str = Header(..., alias="Authorization"),
+    current_user: Optional[CurrentUser] = Depends(get_analysis_user)
 ):
     try:
         # Verifica autenticación
@@ -123,114 +119,21 @@ async def analyze_emotion_base64(
                 detail="No se proporcionó ninguna imagen"
             )
 
-        # Remover prefijo data:image si existe y decodificar
-        image_data = request.image
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-
+        # Decodificar y validar (formato, tamaño y dimensiones) sin decodificar los píxeles
         try:
-            image_bytes = base64.b64decode(image_data)
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de imagen inválido (no es Base64)."
-            )
+            image_bytes = validate_image_bytes(decode_base64_image(request.image)).data
+        except ImageValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
 
-        # Validar que sea una imagen válida
         try:
-            img = Image.open(io.BytesIO(image_bytes))
-            img.verify()
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de imagen inválido. Use JPEG, PNG o WebP."
-            )
-
-        # If AWS credentials are configured, try to use Rekognition. Otherwise fallback to mockup.
-        use_aws = bool(getattr(settings, 'AWS_ACCESS_KEY_ID', None) and getattr(settings, 'AWS_SECRET_ACCESS_KEY', None))
-
-        # Mapping from AWS Rekognition emotion types to our app emotion keys
-        aws_to_app = {
-            'HAPPY': 'happy',
-            'SAD': 'sad',
-            'ANGRY': 'angry',
-            'CALM': 'relaxed',
-            'SURPRISED': 'energetic',
-            'CONFUSED': 'relaxed',
-            'DISGUSTED': 'angry',
-            'FEAR': 'sad'
-        }
-
-        from datetime import datetime
-
-        if use_aws:
-            try:
-                # Call Rekognition detect_faces
-                result = await rekognition_service.detect_faces(image_bytes)
-
-                if not result.get('success'):
-                    # Fallback to mockup if AWS call failed
-                    raise Exception(result.get('error', 'AWS Rekognition returned an error'))
-
-                faces = result.get('faces', [])
-                if not faces:
-                    # No faces detected -> fallback to mockup
-                    raise Exception('No faces detected')
-
-                # Use first face for emotion analysis
-                emotions_list = faces[0].get('emotions', [])
-
-                # Convert to dictionary and normalize confidences to 0..1
-                emotions_detected = {}
-                for e in emotions_list:
-                    typ = e.get('Type') or e.get('type') or e.get('emotion')
-                    conf = e.get('Confidence') or e.get('confidence') or 0.0
-                    conf = float(conf) / 100.0
-                    key = aws_to_app.get(typ.upper(), typ.lower() if isinstance(typ, str) else str(typ))
-                    if key in emotions_detected:
-                        emotions_detected[key] += conf
-                    else:
-                        emotions_detected[key] = conf
-
-                # Normalize after mapping and summing
-                mapped_total = sum(emotions_detected.values())
-                if mapped_total > 0:
-                    for k in list(emotions_detected.keys()):
-                        emotions_detected[k] = round(emotions_detected[k] / mapped_total, 3)
-
-                # Pick top emotion by normalized value
-                if emotions_detected:
-                    app_top = max(emotions_detected, key=lambda k: emotions_detected[k])
-                    top_conf = emotions_detected[app_top]
-                else:
-                    app_top = None
-                    top_conf = 0.0
-
-                emotion_data = {
-                    'emotion': app_top,
-                    'confidence': round(top_conf, 4),
-                    'emotions_detected': emotions_detected,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'message': 'Análisis completado exitosamente (AWS Rekognition)'
-                }
-
-                print(f"✅ Análisis Rekognition: {app_top} ({emotion_data['confidence']*100:.1f}%)")
-                return EmotionAnalysisResponse(**emotion_data)
-
-            except (BotoCoreError, ClientError) as be:
-                print(f"❌ AWS Rekognition error: {be}")
-                # Fallthrough to mockup
-            except Exception as e:
-                print(f"❌ Rekognition processing error: {e}")
-                # Fallthrough to mockup
-
-        # If we reach here, use mockup behavior (previous implementation)
-        emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
-        emotion_data = MOCK_EMOTIONS[emotion_key].copy()
-        emotion_data["timestamp"] = datetime.utcnow().isoformat()
-        emotion_data["message"] = f"Análisis completado exitosamente (modo mockup)"
-        print(f"✅ Análisis mockup: {emotion_key} ({emotion_data['confidence']*100:.1f}%)")
-        return EmotionAnalysisResponse(**emotion_data)
+            emotion_data = await analyze_image(image_bytes)
+        except EmotionAnalysisError as e:
+            # Solo sin fallback al mockup (EMOTION_ENGINE_FALLBACK_TO_MOCK=False)
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        analysis_id = record_analysis(
+            current_user, emotion_data.get("emotion"), emotion_data.get("confidence"), [emotion_data]
+        )
+        return EmotionAnalysisResponse(**emotion_data, analysis_id=analysis_id)
         
     except HTTPException:
         raise
@@ -245,12 +148,14 @@ async def analyze_emotion_base64(
 @router.post("/analyze", response_model=EmotionAnalysisResponse, status_code=status.HTTP_200_OK)
 async def analyze_emotion_file(
     image: UploadFile = File(...),
-    authorization: str = Header(..., alias="Authorization")
+    authorization: str = Header(..., alias="Authorization"),
+    current_user: Optional[CurrentUser] = Depends(get_analysis_user)
 ):
     """
-    🎭 Análisis de emoción desde archivo de imagen (MOCKUP)
-    
-    Alternativa para subir archivos directamente en lugar de Base64.
+    🎭 Análisis de emoción desde archivo de imagen (multipart)
+
+    Misma lógica que /analyze-base64 pero sin la sobrecarga del Base64:
+    los bytes llegan tal cual y se leen por bloques con un tope de tamaño.
     """
     try:
         # Verificar autenticación
@@ -267,31 +172,21 @@ async def analyze_emotion_file(
                 detail="El archivo debe ser una imagen (JPEG, PNG, WebP)"
             )
         
-        # Leer contenido
-        contents = await image.read()
-        
-        # Validar que sea una imagen válida
+        # Leer contenido (con tope) y validar que sea una imagen válida
         try:
-            img = Image.open(io.BytesIO(contents))
-            img.verify()
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Archivo de imagen corrupto o inválido"
-            )
-        
-        # 🎲 Seleccionar emoción aleatoria (MOCKUP)
-        emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
-        emotion_data = MOCK_EMOTIONS[emotion_key].copy()
-        
-        # Agregar timestamp
-        from datetime import datetime
-        emotion_data["timestamp"] = datetime.utcnow().isoformat()
-        emotion_data["message"] = f"Análisis completado exitosamente (modo mockup)"
+            image_bytes = validate_image_bytes(await read_upload(image)).data
+        except ImageValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
         
-        print(f"✅ Análisis mockup (file): {emotion_key} ({emotion_data['confidence']*100:.1f}%)")
-        
-        return EmotionAnalysisResponse(**emotion_data)
+        try:
+            emotion_data = await analyze_image(image_bytes)
+        except EmotionAnalysisError as e:
+            # Solo sin fallback al mockup (EMOTION_ENGINE_FALLBACK_TO_MOCK=False)
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        analysis_id = record_analysis(
+            current_user, emotion_data.get("emotion"), emotion_data.get("confidence"), [emotion_data]
+        )
+        return EmotionAnalysisResponse(**emotion_data, analysis_id=analysis_id)
         
     except HTTPException:
         raise
@@ -303,14 +198,132 @@ async def analyze_emotion_file(
         )
 
 
+@router.post("/analyze-batch", response_model=BatchAnalysisResponse, status_code=status.HTTP_200_OK)
+async def analyze_emotion_batch(
+    images: List[UploadFile] = File(...),
+    authorization: str = Header(..., alias="Authorization"),
+    current_user: Optional[CurrentUser] = Depends(get_analysis_user)
+):
+    """
+    🎞️ Análisis de una ráfaga de frames en una sola request
+
+    Cada imagen pasa por el mismo pipeline que /analyze, con como máximo
+    ANALYSIS_BATCH_CONCURRENCY análisis en paralelo. Devuelve el resultado
+    de cada frame, la distribución agregada y el mejor frame (mayor
+    confianza de cara).
+    """
+    try:
+        # Verificar autenticación
+        if not authorization or not authorization.startswith("Bearer "):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token inválido o ausente"
+            )
+
+        if len(images) > settings.ANALYSIS_BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Máximo {settings.ANALYSIS_BATCH_MAX_IMAGES} imágenes por lote"
+            )
+
+        # Un frame inválido no invalida el lote: se reporta en su resultado
+        results = [BatchImageResult(index=i, filename=image.filename) for i, image in enumerate(images)]
+        valid_indexes = []
+        valid_bytes = []
+        for i, image in enumerate(images):
+            if not image.content_type or not image.content_type.startswith("image/"):
+                results[i].error = "El archivo debe ser una imagen (JPEG, PNG, WebP)"
+                results[i].status_code = status.HTTP_400_BAD_REQUEST
+                continue
+            try:
+                valid_bytes.append(validate_image_bytes(await read_upload(image)).data)
+                valid_indexes.append(i)
+            except ImageValidationError as e:
+                results[i].error = str(e)
+                results[i].status_code = e.status_code
+
+        analyses = await analyze_images(valid_bytes, settings.ANALYSIS_BATCH_CONCURRENCY)
+
+        frames: List[Optional[Dict]] = [None] * len(images)
+        for i, analysis in zip(valid_indexes, analyses):
+            if isinstance(analysis, EmotionAnalysisError):
+                results[i].error = str(analysis)
+                results[i].status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+                continue
+            if isinstance(analysis, Exception):
+                print(f"❌ Error en análisis del frame {i}: {analysis}")
+                results[i].error = "Error procesando la imagen"
+                results[i].status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+                continue
+            frames[i] = analysis
+            results[i].result = EmotionAnalysisResponse(**analysis)
+
+        analyzed = [frame for frame in frames if frame]
+        distribution = aggregate_emotions(analyzed)
+        emotion, confidence = top_emotion(distribution)
+        best_index = best_frame(frames)
+
+        print(f"✅ Lote analizado: {len(analyzed)}/{len(images)} frames, emoción dominante: {emotion}")
+
+        return BatchAnalysisResponse(
+            results=results,
+            emotion=emotion,
+            confidence=confidence,
+            emotions_distribution=distribution,
+            best_index=best_index,
+            best=results[best_index].result if best_index is not None else None,
+            analyzed=len(analyzed),
+            failed=len(images) - len(analyzed),
+            timestamp=datetime.utcnow().isoformat(),
+            analysis_id=record_analysis(current_user, emotion, confidence, analyzed)
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error en análisis por lotes: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error procesando las imágenes. Por favor, intenta nuevamente."
+        )
+
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_current_user)])
+async def emotion_cache_stats():
+    """
+    Métricas de la caché de resultados (hits exactos/perceptuales, hit rate, memoria).
+    Solo con sesión.
+    """
+    return emotion_cache.stats()
+
+
+@router.get("/prefilter-stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_current_user)])
+async def face_prefilter_stats():
+    """
+    Contadores del prefiltro local de caras (frames descartados sin llamar a AWS).
+    Solo con sesión.
+    """
+    return dict(face_prefilter.stats(), enabled=settings.FACE_PREFILTER_ENABLED)
+
+
+@router.get("/engine-stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_current_user)])
+async def emotion_engine_stats():
+    """
+    Motor de emociones activo y sus latencias (para comparar motores).
+    Solo con sesión.
+    """
+    return get_emotion_engine().stats()
+
+
 @router.get("/test", status_code=status.HTTP_200_OK)
 async def test_analysis():
     """
     🧪 Endpoint de prueba para verificar que el servicio funciona
     """
+    mode = get_emotion_engine().name
     return {
         "status": "ok",
-        "message": "Servicio de análisis funcionando (modo mockup)",
+        "message": f"Servicio de análisis funcionando (modo {mode})",
         "available_emotions": list(MOCK_EMOTIONS.keys()),
-        "note": "Este es un servicio mockup para desarrollo. No usa AWS Rekognition."
+        "note": "El motor se elige con EMOTION_ENGINE; si no da resultado se devuelven emociones mockup."
     }
\ No newline at end of file
@@ -0,0 +1,158 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+
+from server.core.config import settings
+from server.core.security import verify_token
+from server.services.emotion_analysis import EmotionSmoother, analyze_frame, top_emotion
+from server.services.emotion_cache import cache_scope
+from server.utils.image import ImageValidationError, decode_base64_image, validate_image_bytes
+
+router = APIRouter(prefix="/v1/analysis", tags=["analysis"])
+
+
+class _LatestFrame:
+    """
+    Buzón de un solo frame: si llega uno nuevo antes de analizar el
+    anterior, el anterior se descarta (latest-frame-wins)
+    """
+
+    def __init__(self):
+        self.payload: Optional[Union[bytes, str]] = None
+        self.seq = 0
+        self.received = 0
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, payload: Union[bytes, str]) -> None:
+        self.received += 1
+        if self.payload is not None:
+            self.dropped += 1
+        self.payload = payload
+        self.seq = self.received
+        self.ready.set()
+
+    def take(self):
+        payload, seq = self.payload, self.seq
+        self.payload = None
+        self.ready.clear()
+        return payload, seq
+
+
+async def _analyze_frame(payload: Union[bytes, str], smoother: EmotionSmoother) -> Dict:
+    try:
+        raw = payload if isinstance(payload, bytes) else decode_base64_image(payload)
+        image_bytes = validate_image_bytes(raw).data
+    except ImageValidationError as e:
+        return {"type": "error", "detail": str(e), "status_code": e.status_code}
+
+    try:
+        result = await analyze_frame(image_bytes)
+    except Exception as e:
+        # Sin cara o error del motor: el frame no cuenta para el suavizado
+        print(f"⚠️ Frame sin resultado: {e}")
+        return {"type": "skipped", "reason": str(e)}
+
+    smoothed = smoother.update(result["emotions_detected"])
+    emotion, confidence = top_emotion(smoothed)
+    return {
+        "type": "result",
+        "emotion": emotion,
+        "confidence": confidence,
+        "emotions_detected": smoothed,
+        "frame_emotion": result["emotion"],
+        "frame_emotions_detected": result["emotions_detected"],
+        "face_confidence": result.get("face_confidence"),
+        "cache_hit": result.get("cache_hit"),
+        "engine": result.get("engine"),
+    }
+
+
+@router.websocket("/stream")
+async def analysis_stream(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    📹 Análisis en vivo por WebSocket
+
+    El cliente envía frames como mensajes binarios (JPEG/PNG/WebP) o como
+    texto JSON {"image": "<base64>"}; {"type": "reset"} reinicia el
+    suavizado. Solo se analiza el frame más reciente: si el análisis va por
+    detrás, los frames intermedios se descartan. Cada respuesta lleva la
+    distribución suavizada (EMA) y la del frame analizado.
+
+    Los navegadores no permiten cabeceras en WebSocket, así que el token de
+    acceso va en el query param `token`.
+    """
+    try:
+        payload = verify_token(token or "")
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # Resultados cacheados solo de este usuario (la tarea de análisis hereda el contexto)
+    cache_scope.set(payload.get("sub"))
+
+    await websocket.accept()
+    smoother = EmotionSmoother(settings.ANALYSIS_STREAM_EMA_ALPHA)
+    mailbox = _LatestFrame()
+    analyzed = 0
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                mailbox.put(message["bytes"])
+                continue
+            try:
+                data = json.loads(message.get("text") or "")
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "reset":
+                smoother.reset()
+            elif data.get("image"):
+                mailbox.put(data["image"])
+
+    async def analyze_frames():
+        nonlocal analyzed
+        loop = asyncio.get_running_loop()
+        last_started = None
+        while True:
+            await mailbox.ready.wait()
+            if last_started is not None:
+                # Los frames que lleguen durante la espera reemplazan al pendiente
+                wait = settings.ANALYSIS_STREAM_MIN_INTERVAL - (loop.time() - last_started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            payload, seq = mailbox.take()
+            last_started = loop.time()
+
+            response = await _analyze_frame(payload, smoother)
+            if response["type"] == "result":
+                analyzed += 1
+            await websocket.send_json({
+                **response,
+                "frame": seq,
+                "received": mailbox.received,
+                "analyzed": analyzed,
+                "dropped": mailbox.dropped,
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+
+    receiver = asyncio.create_task(receive_frames())
+    analyzer = asyncio.create_task(analyze_frames())
+    try:
+        done, _ = await asyncio.wait({receiver, analyzer}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"❌ Error en stream de análisis: {task.exception()}")
+    finally:
+        for task in (receiver, analyzer):
+            task.cancel()
+        await asyncio.wait({receiver, analyzer})
+
+    print(f"📹 Stream cerrado: {mailbox.received} frames recibidos, {analyzed} analizados, {mailbox.dropped} descartados")
@@ -2,27 +2,26 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, R
 from fastapi.responses import RedirectResponse, JSONResponse
 from jose import JWTError
 from fastapi import Response, Request
-from sqlalchemy.orm import Session
-from server.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from server.db.session import get_async_db
 from server.schemas.user import UserCreate, UserResponse
 from server.schemas.auth import UserLogin, TokenResponse
 from server.controllers.auth_controller import register_user, login_user
 from server.services.spotify import get_spotify_auth_url, get_spotify_token
 import secrets
 
-from server.core.security import verify_token
-from server.db.models.user import User
+from server.core.dependencies import CurrentUser, get_current_user
 from server.core.config import settings
 
 router = APIRouter(prefix="/v1/auth", tags=["auth"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    return register_user(db, user)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await register_user(db, user)
 
 @router.post("/login", response_model=TokenResponse,status_code=status.HTTP_200_OK)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    return login_user(db, user)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    return await login_user(db, user)
 
 
 @router.get("/spotify")
@@ -168,59 +167,9 @@ def spotify_revoke(request: Request):
             pass
     return res
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, Header
-from server.core.security import verify_token
-from server.db.models.user import User
-
-# ... código existente ...
-
 @router.get("/me", response_model=UserResponse, status_code=status.HTTP_200_OK)
-def get_current_user(
-    authorization: str = Header(..., alias="Authorization"),
-    db: Session = Depends(get_db)
-):
+async def get_me(current_user: CurrentUser = Depends(get_current_user)):
     """
     Obtiene información del usuario autenticado actual
     """
-    try:
-        # Verificar formato del header
-        if not authorization.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Formato de token inválido"
-            )
-        
-        # Extraer token
-        token = authorization.split(" ")[1]
-        
-        # Verificar token y obtener email
-        payload = verify_token(token)
-        email = payload.get("sub")
-        
-        if not email:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido"
-            )
-        
-        # Buscar usuario en la base de datos
-        user = db.query(User).filter(User.email == email).first()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Usuario no encontrado"
-            )
-        
-        return UserResponse.from_orm(user)
-        
-    except (JWTError, ValueError) as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error al obtener información del usuario"
-        )
+    return UserResponse.model_validate(current_user)
@@ -15,7 +15,7 @@ class ContactResponse(BaseModel):
     success: bool
 
 @router.post("/send", response_model=ContactResponse, status_code=status.HTTP_200_OK)
-def send_contact_message(data: ContactRequest):
+async def send_contact_message(data: ContactRequest):
     """
     Envía un mensaje de contacto al equipo de soporte
     """
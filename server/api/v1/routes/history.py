@@ -0,0 +1,98 @@
+from collections import defaultdict
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, status
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.core.config import settings
+from server.core.dependencies import CurrentUser, get_current_user
+from server.db.models.history import Cancion, Emocion
+from server.db.session import get_async_db
+from server.services.history_writer import history_writer
+
+router = APIRouter(prefix="/v1/history", tags=["history"])
+
+
+class HistoryTrack(BaseModel):
+    title: str
+    artist: Optional[str] = None
+    album: Optional[str] = None
+
+class HistoryEntry(BaseModel):
+    id: int
+    emotion: str
+    confidence: Optional[float] = None
+    analysis_id: Optional[str] = None
+    created_at: Optional[str] = None
+    tracks: List[HistoryTrack]
+
+class HistoryPage(BaseModel):
+    items: List[HistoryEntry]
+    # Se pasa como `before_id` para pedir la página siguiente; None si no hay más
+    next_cursor: Optional[int] = None
+
+
+@router.get("/", response_model=HistoryPage, status_code=status.HTTP_200_OK)
+async def get_history(
+    before_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Historial de emociones del usuario, de la más reciente a la más antigua
+
+    Paginación por keyset: cada página es un rango de `id` sobre el índice
+    (ID_usuario, id), sin OFFSET, así que su costo no crece con la página.
+    """
+    # Solo si este usuario tiene registros sin escribir (siempre los más
+    # recientes, así que solo afectan a la primera página): así aparecen ya
+    # en esta lectura sin forzar un flush por cada consulta
+    if before_id is None and history_writer.has_pending(current_user.id):
+        await history_writer.flush()
+
+    query = select(Emocion).where(Emocion.usuario_id == current_user.id)
+    if before_id is not None:
+        query = query.where(Emocion.id < before_id)
+    # Una fila de más para saber si hay otra página
+    emotions = list(await db.scalars(query.order_by(Emocion.id.desc()).limit(limit + 1)))
+    has_more = len(emotions) > limit
+    emotions = emotions[:limit]
+
+    tracks_by_emotion = defaultdict(list)
+    if emotions:
+        tracks = await db.scalars(
+            select(Cancion)
+            .where(Cancion.emocion_id.in_([emotion.id for emotion in emotions]))
+            .order_by(Cancion.id)
+        )
+        for track in tracks:
+            tracks_by_emotion[track.emocion_id].append(
+                HistoryTrack(title=track.titulo, artist=track.artista, album=track.album)
+            )
+
+    return HistoryPage(
+        items=[
+            HistoryEntry(
+                id=emotion.id,
+                emotion=emotion.nombre,
+                confidence=emotion.confianza,
+                analysis_id=str(emotion.analisis_id) if emotion.analisis_id else None,
+                created_at=emotion.fecha_creacion.isoformat() if emotion.fecha_creacion else None,
+                tracks=tracks_by_emotion[emotion.id],
+            )
+            for emotion in emotions
+        ],
+        next_cursor=emotions[-1].id if has_more else None,
+    )
+
+
+@router.get("/writer-stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_current_user)])
+async def history_writer_stats():
+    """
+    Contadores del escritor por lotes (pendientes, escritos, lotes, descartados).
+    Estado interno: solo con sesión.
+    """
+    return history_writer.stats()
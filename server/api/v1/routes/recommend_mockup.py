@@ -11,86 +11,51 @@ Para activarlo:
 O simplemente usa el endpoint /recommend/mockup
 """
 
-from fastapi import APIRouter, Query, HTTPException
-import json
-import os
-import random
+from typing import Optional
 
-router = APIRouter(prefix="/recommend", tags=["recommendations"])
-
-# Cargar datos mockup desde el JSON
-def load_mock_data():
-    json_path = os.path.join(os.path.dirname(__file__), '../../../../recomendacionesSpotify.json')
-    
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        # Datos de respaldo si no existe el archivo
-        return generate_fallback_data()
-
-def generate_fallback_data():
-    """Datos de respaldo si no se encuentra el JSON"""
-    return {
-        "tracks": [
-            {
-                "name": "Happy Song",
-                "artists": [{"name": "Artist Name"}],
-                "album": {
-                    "name": "Album Name",
-                    "images": [{"url": "https://via.placeholder.com/300"}]
-                },
-                "external_urls": {"spotify": "https://open.spotify.com"},
-                "duration_ms": 180000,
-                "popularity": 75
-            }
-        ] * 10,
-        "emotion": "happy",
-        "total_tracks": 10,
-        "search_method": "fallback"
-    }
+from fastapi import APIRouter, Header, Query, HTTPException
+from server.core.config import settings
+from server.core.dependencies import get_optional_user
+from server.services.history_writer import history_writer
+from server.services.mock_catalogue import EMOTIONS as MOCK_EMOTIONS, mock_catalogue
 
-# Mapeo de emociones a diferentes conjuntos de canciones
-EMOTION_TRACK_FILTERS = {
-    "happy": lambda tracks: tracks[:30],  # Primeras 30
-    "sad": lambda tracks: tracks[:30],
-    "angry": lambda tracks: tracks[:30],
-    "relaxed": lambda tracks: tracks[:30],
-    "energetic": lambda tracks: tracks[:30]
-}
+router = APIRouter(prefix="/recommend", tags=["recommendations"])
 
 @router.get("/mockup")
-def get_mockup_recommendations(emotion: str = Query(...)):
+async def get_mockup_recommendations(
+    emotion: str = Query(...),
+    analysis_id: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None, alias="Authorization")
+):
     """
     🎵 Devuelve recomendaciones musicales MOCKUP
     
     No requiere autenticación ni configuración de Spotify.
-    Usa datos del archivo recomendacionesSpotify.json
+    Usa datos del archivo recomendacionesSpotify.json (cargado una vez, ver MOCK_CATALOGUE_*)
+    Con `analysis_id` (de /v1/analysis) y el token de la app, las canciones se guardan en el historial
     """
     emotion = emotion.lower()
     
-    if emotion not in EMOTION_TRACK_FILTERS:
+    if emotion not in MOCK_EMOTIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Emoción inválida. Opciones: {', '.join(EMOTION_TRACK_FILTERS.keys())}"
+            detail=f"Emoción inválida. Opciones: {', '.join(MOCK_EMOTIONS)}"
         )
     
-    # Cargar datos
-    mock_data = load_mock_data()
-    all_tracks = mock_data.get("tracks", [])
+    # Catálogo precargado: se muestrean índices, sin leer el JSON ni barajar la lista compartida
+    selected_tracks = mock_catalogue.sample(emotion, settings.MOCK_CATALOGUE_TRACKS_PER_EMOTION)
     
-    if not all_tracks:
+    if not selected_tracks:
         raise HTTPException(
             status_code=500,
             detail="No se pudieron cargar las canciones mockup"
         )
     
-    # Aplicar filtro según emoción y aleatorizar
-    random.shuffle(all_tracks)
-    filter_func = EMOTION_TRACK_FILTERS[emotion]
-    selected_tracks = filter_func(all_tracks)
-    
+    if analysis_id:
+        # El usuario solo se resuelve para guardar; si la BD falla, no se guarda
+        current_user = await get_optional_user(authorization)
+        history_writer.record_tracks(analysis_id, current_user and current_user.id, selected_tracks)
+
     return {
         "tracks": selected_tracks,
         "emotion": emotion,
@@ -102,16 +67,19 @@ def get_mockup_recommendations(emotion: str = Query(...)):
 
 
 @router.get("/test-mockup")
-def test_mockup():
+async def test_mockup():
     """
     🧪 Prueba que el sistema mockup funcione
     """
     try:
-        data = load_mock_data()
+        catalogue = mock_catalogue.snapshot()
         return {
             "status": "ok",
-            "tracks_available": len(data.get("tracks", [])),
-            "emotions": list(EMOTION_TRACK_FILTERS.keys()),
+            "tracks_available": len(catalogue.tracks),
+            "source": catalogue.source,
+            "tracks_per_emotion": {emotion: len(indices) for emotion, indices in catalogue.by_emotion.items()},
+            "unpartitioned_emotions": sorted(catalogue.unpartitioned),
+            "emotions": list(MOCK_EMOTIONS),
             "note": "Sistema mockup funcionando correctamente"
         }
     except Exception as e:
@@ -1,22 +1,57 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from server.db.database import init_db_from_sql
+from server.db.database import apply_migrations, init_db_from_sql
 from server.api import router as api_router
 from server.db.models.user import Base   # importa el Base que contiene tus modelos
-from server.db.session import engine  # importa el engine de la base de datos
+from server.db.session import dispose_async_engine, engine  # importa el engine de la base de datos
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.exceptions import RequestValidationError
 from server.controllers import rekognition_controller
+from server.core.config import settings
+from server.core.security import shutdown_hashing_pool
+from server.services.spotify_client import spotify_client
+from server.services.playlist_cache import playlist_cache
+from server.services.aws_rekognition_service import rekognition_service
+from server.services.emotion_analysis import shutdown_emotion_engine
+from server.services.history_writer import history_writer
+from server.services.mail_queue import mail_queue
+from server.utils import image as image_utils
 from contextlib import asynccontextmanager
 
+from server.middlewares.body_limit import BodySizeLimitMiddleware
 from server.middlewares.error_handler import (
     http_exception_handler,
     validation_exception_handler,
     generic_exception_handler,
 )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    if settings.DB_INIT_ON_STARTUP:
+        init_db_from_sql()
+    elif settings.DB_MIGRATE_ON_STARTUP:
+        try:
+            apply_migrations()
+        except Exception as e:
+            # Sin BD al arrancar no se impide iniciar; el historial reintenta sus escrituras
+            print(f"⚠️ No se pudieron aplicar las migraciones: {e}")
+    #Base.metadata.drop_all(bind=engine)
+    #Base.metadata.create_all(bind=engine)
+    yield #Antes de Yield, lo que hace la app al iniciar
+    #Despues de Yield, lo que hace la app al cerrar
+    await mail_queue.aclose(timeout=settings.MAIL_SHUTDOWN_TIMEOUT)
+    # Antes de cerrar el engine: escribe lo que quede en el buffer
+    await history_writer.aclose()
+    await playlist_cache.aclose()
+    await spotify_client.aclose()
+    shutdown_emotion_engine()
+    rekognition_service.shutdown()
+    image_utils.shutdown()
+    shutdown_hashing_pool()
+    await dispose_async_engine()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -26,6 +61,17 @@ origins = [
     # Cuando se obtenga el dominio se agrega aqui
 ]
 
+# Tope de tamaño para las rutas que reciben imágenes. Se registra antes que
+# CORS para quedar dentro: así el 413 también lleva las cabeceras CORS
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/v1/analysis": settings.UPLOAD_MAX_BODY_BYTES,
+        "/v1/analysis/analyze-batch": settings.ANALYSIS_BATCH_MAX_BODY_BYTES,
+        "/rekognition": settings.UPLOAD_MAX_BODY_BYTES,
+    },
+)
+
 #proteccion CORS
 app.add_middleware(
     CORSMiddleware,
@@ -40,14 +86,6 @@ app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 
-@asynccontextmanager
-async def lifespan(app):
-    init_db_from_sql()
-    #Base.metadata.drop_all(bind=engine)
-    #Base.metadata.create_all(bind=engine)
-    yield #Antes de Yield, lo que hace la app al iniciar
-    #Despues de Yield, lo que hace la app al cerrar
-
 app.include_router(api_router)
 
 @app.get("/health", tags=["Health"])
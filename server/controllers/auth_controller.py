@@ -1,14 +1,19 @@
 from fastapi import HTTPException, status
-from server.core.security import hash_password, verify_password, create_access_token, verify_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from server.core.security import (
+    create_access_token,
+    hash_password_async,
+    needs_rehash,
+    verify_password_async,
+)
 from server.schemas.user import UserCreate, UserResponse
 from server.schemas.auth import UserLogin, TokenResponse
-from server.db.session import SessionLocal
-from sqlalchemy.orm import Session
 from server.db.models.user import User
 import re
 
 
-def register_user(db: Session, user: UserCreate) -> UserResponse:
+async def register_user(db: AsyncSession, user: UserCreate) -> UserResponse:
     
     # Simple email regex validation
     email_regex = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
@@ -18,7 +23,7 @@ def register_user(db: Session, user: UserCreate) -> UserResponse:
             detail="El correo electrónico no es válido"
         )
 
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == user.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -27,7 +32,7 @@ def register_user(db: Session, user: UserCreate) -> UserResponse:
 
 
     try:
-        hashed_pw = hash_password(user.password)
+        hashed_pw = await hash_password_async(user.password)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -39,20 +44,28 @@ def register_user(db: Session, user: UserCreate) -> UserResponse:
         password=hashed_pw
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return UserResponse.model_validate(db_user)
 
 
 
-def login_user(db: Session, user: UserLogin) -> TokenResponse:
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password):
+async def login_user(db: AsyncSession, user: UserLogin) -> TokenResponse:
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if not db_user or not await verify_password_async(user.password, db_user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Correo o contraseña invalida"
         )
-    access_token = create_access_token(data={"sub": db_user.email})
-    return TokenResponse(access_token=access_token)  # ← ¡Este return es esencial!
 
+    access_token = create_access_token(data={"sub": db_user.email})
 
+    # Rehash transparente si el hash guardado usa menos rondas que BCRYPT_ROUNDS
+    if needs_rehash(db_user.password):
+        try:
+            db_user.password = await hash_password_async(user.password)
+            await db.commit()
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el hash de la contraseña: {e}")
+            await db.rollback()
+    return TokenResponse(access_token=access_token)  # ← ¡Este return es esencial!
@@ -1,10 +1,12 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from server.db.models.user import User
 from server.db.models.password_recovery import PasswordRecovery
 from server.services.email import send_verification_email, generate_verification_code
-from server.core.security import hash_password
+from server.core.dependencies import invalidate_cached_user
+from server.core.security import hash_password_async
 from server.schemas.password_recovery import (
     RequestPasswordRecovery,
     VerifyRecoveryCode,
@@ -12,12 +14,12 @@ from server.schemas.password_recovery import (
     PasswordRecoveryResponse
 )
 
-def request_password_recovery(db: Session, data: RequestPasswordRecovery) -> PasswordRecoveryResponse:
+async def request_password_recovery(db: AsyncSession, data: RequestPasswordRecovery) -> PasswordRecoveryResponse:
     """
     Solicita recuperación de contraseña y envía código por email
     """
     # Verificar si el usuario existe
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
     
     if not user:
         # Por seguridad, no revelamos si el email existe o no
@@ -27,10 +29,11 @@ def request_password_recovery(db: Session, data: RequestPasswordRecovery) -> Pas
         )
     
     # Invalidar códigos anteriores no usados de este usuario
-    db.query(PasswordRecovery).filter(
-        PasswordRecovery.user_id == user.id,
-        PasswordRecovery.is_used == False
-    ).update({"is_used": True})
+    await db.execute(
+        update(PasswordRecovery)
+        .where(PasswordRecovery.user_id == user.id, PasswordRecovery.is_used == False)
+        .values(is_used=True)
+    )
     
     # Generar nuevo código
     code = generate_verification_code()
@@ -44,9 +47,9 @@ def request_password_recovery(db: Session, data: RequestPasswordRecovery) -> Pas
     )
     
     db.add(recovery)
-    db.commit()
+    await db.commit()
     
-    # Enviar email con el código
+    # Encolar email con el código (se envía en segundo plano)
     email_sent = send_verification_email(user.email, code)
     
     if not email_sent:
@@ -61,12 +64,12 @@ def request_password_recovery(db: Session, data: RequestPasswordRecovery) -> Pas
     )
 
 
-def verify_recovery_code(db: Session, data: VerifyRecoveryCode) -> PasswordRecoveryResponse:
+async def verify_recovery_code(db: AsyncSession, data: VerifyRecoveryCode) -> PasswordRecoveryResponse:
     """
     Verifica que el código de recuperación sea válido
     """
     # Buscar usuario
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
     
     if not user:
         raise HTTPException(
@@ -75,12 +78,12 @@ def verify_recovery_code(db: Session, data: VerifyRecoveryCode) -> PasswordRecov
         )
     
     # Buscar código válido
-    recovery = db.query(PasswordRecovery).filter(
+    recovery = await db.scalar(select(PasswordRecovery).where(
         PasswordRecovery.user_id == user.id,
         PasswordRecovery.code == data.code,
         PasswordRecovery.is_used == False,
         PasswordRecovery.expires_at > datetime.utcnow()
-    ).first()
+    ))
     
     if not recovery:
         raise HTTPException(
@@ -94,12 +97,12 @@ def verify_recovery_code(db: Session, data: VerifyRecoveryCode) -> PasswordRecov
     )
 
 
-def reset_password(db: Session, data: ResetPassword) -> PasswordRecoveryResponse:
+async def reset_password(db: AsyncSession, data: ResetPassword) -> PasswordRecoveryResponse:
     """
     Restablece la contraseña del usuario usando el código de verificación
     """
     # Buscar usuario
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
     
     if not user:
         raise HTTPException(
@@ -108,12 +111,12 @@ def reset_password(db: Session, data: ResetPassword) -> PasswordRecoveryResponse
         )
     
     # Buscar código válido
-    recovery = db.query(PasswordRecovery).filter(
+    recovery = await db.scalar(select(PasswordRecovery).where(
         PasswordRecovery.user_id == user.id,
         PasswordRecovery.code == data.code,
         PasswordRecovery.is_used == False,
         PasswordRecovery.expires_at > datetime.utcnow()
-    ).first()
+    ))
     
     if not recovery:
         raise HTTPException(
@@ -122,12 +125,13 @@ def reset_password(db: Session, data: ResetPassword) -> PasswordRecoveryResponse
         )
     
     # Actualizar contraseña
-    user.password = hash_password(data.new_password)
+    user.password = await hash_password_async(data.new_password)
     
     # Marcar código como usado
     recovery.is_used = True
     
-    db.commit()
+    await db.commit()
+    invalidate_cached_user(user.id)
     
     return PasswordRecoveryResponse(
         message="Contraseña actualizada exitosamente",
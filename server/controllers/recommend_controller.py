@@ -1,4 +1,4 @@
 from server.services.spotify import get_recommendations
 
-def recommend_songs_by_emotion(access_token: str, emotion: str):
-    return get_recommendations(access_token, emotion)
\ No newline at end of file
+async def recommend_songs_by_emotion(access_token: str, emotion: str):
+    return await get_recommendations(access_token, emotion)
\ No newline at end of file
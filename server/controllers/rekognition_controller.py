@@ -7,30 +7,43 @@ from server.schemas.rekognition import (
     FaceComparisonResponse,
     ModerationDetectionResponse
 )
+from server.utils.image import ImageValidationError, validate_image_bytes
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rekognition", tags=["AWS Rekognition"])
 
+
+async def read_image(file: UploadFile) -> bytes:
+    """
+    Lee un archivo subido y lo valida con la misma utilidad que /v1/analysis
+    """
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    try:
+        return validate_image_bytes(await file.read()).data
+    except ImageValidationError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
 @router.post("/detect-faces", response_model=FaceDetectionResponse)
 async def detect_faces(file: UploadFile = File(...)):
     """
     Detecta caras en una imagen
     """
     try:
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        image_bytes = await file.read()
+        image_bytes = await read_image(file)
         
         result = await rekognition_service.detect_faces(image_bytes)
         
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=result["error"])
+        if not result.success:
+            raise HTTPException(status_code=400, detail=result.error)
         
-        return FaceDetectionResponse(**result)
+        return FaceDetectionResponse(**result.to_dict())
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in detect_faces: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -41,10 +54,7 @@ async def detect_labels(file: UploadFile = File(...)):
     Detecta etiquetas/objetos en una imagen
     """
     try:
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        image_bytes = await file.read()
+        image_bytes = await read_image(file)
         
         # ✅ CORREGIDO: Agregar AWAIT aquí
         result = await rekognition_service.detect_labels(image_bytes)
@@ -54,6 +64,8 @@ async def detect_labels(file: UploadFile = File(...)):
         
         return LabelDetectionResponse(**result)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in detect_labels: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -64,10 +76,7 @@ async def detect_text(file: UploadFile = File(...)):
     Detecta texto en una imagen
     """
     try:
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        image_bytes = await file.read()
+        image_bytes = await read_image(file)
         
     
         result = await rekognition_service.detect_text(image_bytes)
@@ -77,6 +86,8 @@ async def detect_text(file: UploadFile = File(...)):
         
         return TextDetectionResponse(**result)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in detect_text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -90,11 +101,8 @@ async def compare_faces(
     Compara caras entre dos imágenes
     """
     try:
-        if not source_file.content_type.startswith('image/') or not target_file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="Both files must be images")
-        
-        source_bytes = await source_file.read()
-        target_bytes = await target_file.read()
+        source_bytes = await read_image(source_file)
+        target_bytes = await read_image(target_file)
         
         # ✅ CORREGIDO: Agregar AWAIT aquí
         result = await rekognition_service.compare_faces(source_bytes, target_bytes)
@@ -104,6 +112,8 @@ async def compare_faces(
         
         return FaceComparisonResponse(**result)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in compare_faces: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -114,10 +124,7 @@ async def detect_moderation(file: UploadFile = File(...)):
     Detecta contenido inapropiado en imágenes
     """
     try:
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        image_bytes = await file.read()
+        image_bytes = await read_image(file)
         
        
         result = await rekognition_service.detect_moderation_labels(image_bytes)
@@ -127,6 +134,8 @@ async def detect_moderation(file: UploadFile = File(...)):
         
         return ModerationDetectionResponse(**result)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in detect_moderation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,24 +1,122 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Ejecuta schema.sql al iniciar (¡borra y recrea las tablas!)
+    DB_INIT_ON_STARTUP: bool = False
+    # Aplica server/migrations/*.sql (idempotentes, sin borrar datos) al iniciar
+    DB_MIGRATE_ON_STARTUP: bool = True
+    # Pool de conexiones: DB_POOL_SIZE fijas + DB_MAX_OVERFLOW temporales por proceso;
+    # las peticiones esperan hasta DB_POOL_TIMEOUT segundos por una conexión libre
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 10
+    # Reciclar conexiones antes de que el servidor (o un proxy) las cierre por inactividad
+    DB_POOL_RECYCLE: int = 1800
+    # Ping (SELECT 1) en cada checkout; con DB_POOL_RECYCLE suele sobrar, activar
+    # solo si hay cortes de red o reinicios frecuentes de Postgres
+    DB_POOL_PRE_PING: bool = False
+    # statement_timeout de Postgres para cada conexión (0 = sin límite)
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    # Log de todas las sentencias SQL (solo para desarrollo)
+    DB_ECHO: bool = False
+    # Avisar de las consultas que tarden más de esto (0 = desactivado)
+    DB_SLOW_QUERY_MS: int = 500
+    # Sesiones async (SQLAlchemy asyncio + psycopg) para auth/usuarios; con False
+    # get_async_db usa la Session síncrona en el threadpool
+    DB_ASYNC_ENABLED: bool = True
 
     # Seguridad
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # Coste de bcrypt (2^N rondas); los hashes con menos se rehacen al hacer login
+    BCRYPT_ROUNDS: int = 12
+    # Pool dedicado para bcrypt (0 = núcleos disponibles); procesos para no competir por el GIL
+    PASSWORD_HASH_WORKERS: int = 0
+    PASSWORD_HASH_USE_PROCESSES: bool = True
+    # Caché de tokens verificados -> usuario (get_current_user)
+    AUTH_USER_CACHE_TTL: int = 60
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 1024
 
     # Email credentials
     EMAIL_SENDER: str
     EMAIL_PASSWORD: str
+    # Servidor SMTP (por defecto Gmail con SSL implícito)
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 465
+    SMTP_USE_SSL: bool = True
+    SMTP_STARTTLS: bool = False
+    # Autenticarse con EMAIL_SENDER / EMAIL_PASSWORD (False para servidores locales de prueba)
+    SMTP_LOGIN: bool = True
+    SMTP_TIMEOUT: float = 10.0
+    # Conexiones inactivas más de esto se cierran y se reabren al siguiente envío
+    SMTP_MAX_IDLE: float = 60.0
+    # Cola de envío en segundo plano
+    MAIL_QUEUE_MAX_SIZE: int = 1000
+    MAIL_WORKERS: int = 2
+    MAIL_MAX_RETRIES: int = 3
+    # Espera antes del reintento N: MAIL_RETRY_BACKOFF * 2^(N-1) segundos
+    MAIL_RETRY_BACKOFF: float = 1.0
+    # Tiempo máximo para vaciar la cola al apagar la app
+    MAIL_SHUTDOWN_TIMEOUT: float = 10.0
 
     SPOTIFY_CLIENT_ID: str
     SPOTIFY_CLIENT_SECRET: str
     # Callback path should match the route defined in the auth router
     SPOTIFY_REDIRECT_URI: str = "http://127.0.0.1:8000/v1/auth/spotify/callback"
+
+    # Cliente HTTP de Spotify (pool compartido)
+    SPOTIFY_HTTP_TIMEOUT: float = 10.0
+    SPOTIFY_HTTP_CONNECT_TIMEOUT: float = 5.0
+    SPOTIFY_HTTP_MAX_CONNECTIONS: int = 20
+    SPOTIFY_HTTP_MAX_KEEPALIVE: int = 10
+    SPOTIFY_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SPOTIFY_HTTP2: bool = True
+    # Páginas de playlist pedidas en paralelo
+    SPOTIFY_PAGE_CONCURRENCY: int = 5
+    # Plazo (segundos) compartido por las búsquedas de género del respaldo
+    SPOTIFY_FALLBACK_DEADLINE: float = 5.0
+    # Planificador de requests: token bucket por aplicación y reintentos
+    SPOTIFY_RATE_LIMIT_PER_SECOND: float = 10.0
+    SPOTIFY_RATE_LIMIT_BURST: int = 20
+    SPOTIFY_MAX_RETRIES: int = 3
+    SPOTIFY_RETRY_BACKOFF: float = 0.5
+    # Retry-After mayor a esto se devuelve al cliente en lugar de esperar
+    SPOTIFY_MAX_RETRY_AFTER: float = 10.0
+
+    # Caché compartida de playlists de emociones
+    SPOTIFY_PLAYLIST_CACHE_ENABLED: bool = True
+    SPOTIFY_PLAYLIST_CACHE_TTL: int = 3600
+    # Segundos antes de caducar en que se refresca en segundo plano
+    SPOTIFY_PLAYLIST_CACHE_REFRESH_MARGIN: int = 300
+    # Opcional: redis://... para compartir la caché entre procesos
+    SPOTIFY_CACHE_REDIS_URL: Optional[str] = None
+    # Catálogo mockup (/recommend/mockup); None usa recomendacionesSpotify.json en la raíz del repo
+    MOCK_CATALOGUE_PATH: Optional[str] = None
+    # Recargar el JSON si cambia su mtime (comprobado como mucho cada N segundos)
+    MOCK_CATALOGUE_RELOAD: bool = False
+    MOCK_CATALOGUE_RELOAD_INTERVAL: float = 2.0
+    MOCK_CATALOGUE_TRACKS_PER_EMOTION: int = 30
+
+    # Historial de emociones (tablas emocion / cancion), escrito por lotes
+    HISTORY_ENABLED: bool = True
+    # Se escribe al juntar HISTORY_BATCH_SIZE registros o cada HISTORY_FLUSH_INTERVAL segundos
+    HISTORY_BATCH_SIZE: int = 200
+    HISTORY_FLUSH_INTERVAL: float = 2.0
+    # Tope de registros en memoria sin escribir; los que lo superan se descartan
+    HISTORY_MAX_PENDING: int = 10000
+    # Análisis recientes a los que aún se pueden asociar canciones (una vez, solo su dueño)
+    HISTORY_ANALYSIS_TTL: int = 3600
+    HISTORY_MAX_OPEN_ANALYSES: int = 10000
+    # Si falla la escritura (BD caída) se reintenta tras HISTORY_RETRY_BACKOFF * 2^(N-1) segundos
+    HISTORY_RETRY_BACKOFF: float = 1.0
+    HISTORY_PAGE_SIZE: int = 20
+    HISTORY_MAX_PAGE_SIZE: int = 100
     
     # AWS Rekognition
     AWS_ACCESS_KEY_ID: str
@@ -27,6 +125,72 @@ class Settings(BaseSettings):
     AWS_REKOGNITION_MAX_LABELS: int = 10
     AWS_REKOGNITION_MIN_CONFIDENCE: float = 75.0
     AWS_REKOGNITION_SIMILARITY_THRESHOLD: float = 90.0
+    # Llamadas a Rekognition fuera del event loop
+    AWS_REKOGNITION_MAX_CONCURRENCY: int = 8
+    AWS_REKOGNITION_MAX_POOL_CONNECTIONS: int = 10
+    # Topes por intento: se reducen si hace falta para que todos los intentos
+    # quepan en AWS_REKOGNITION_CALL_TIMEOUT (ver client_config)
+    AWS_REKOGNITION_CONNECT_TIMEOUT: float = 3.0
+    AWS_REKOGNITION_READ_TIMEOUT: float = 10.0
+    AWS_REKOGNITION_MAX_ATTEMPTS: int = 2
+    # Plazo total por llamada (incluye la espera en el pool)
+    AWS_REKOGNITION_CALL_TIMEOUT: float = 15.0
+    # Incluir la respuesta completa de boto3 (raw_response) en los resultados; solo para depurar
+    AWS_REKOGNITION_INCLUDE_RAW: bool = False
+
+    # Preprocesado de imágenes antes de Rekognition
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1024
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PREPROCESS_WORKERS: int = 4
+    # Límites de validación (se comprueban antes de decodificar)
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    # Tope del cuerpo de la request en las rutas de imágenes (cubre el Base64 de IMAGE_MAX_BYTES)
+    UPLOAD_MAX_BODY_BYTES: int = 14 * 1024 * 1024
+
+    # Análisis por lotes (/v1/analysis/analyze-batch)
+    ANALYSIS_BATCH_MAX_IMAGES: int = 16
+    ANALYSIS_BATCH_CONCURRENCY: int = 4
+    ANALYSIS_BATCH_MAX_BODY_BYTES: int = 64 * 1024 * 1024
+
+    # Análisis en vivo por WebSocket (/v1/analysis/stream)
+    ANALYSIS_STREAM_EMA_ALPHA: float = 0.4
+    # Intervalo mínimo entre análisis de un mismo socket (los frames intermedios se descartan)
+    ANALYSIS_STREAM_MIN_INTERVAL: float = 0.2
+
+    # Prefiltro local de caras antes de Rekognition (requiere opencv-python-headless)
+    FACE_PREFILTER_ENABLED: bool = False
+    # None usa la cascada frontal incluida en OpenCV
+    FACE_PREFILTER_CASCADE_PATH: Optional[str] = None
+    FACE_PREFILTER_DETECT_EDGE: int = 480
+    FACE_PREFILTER_MIN_FACE: int = 40
+    # Margen alrededor de la cara al recortar, relativo a su tamaño
+    FACE_PREFILTER_CROP_MARGIN: float = 0.4
+
+    # Motor de análisis de emociones: auto (Rekognition si hay credenciales, si no mockup),
+    # rekognition, mock (determinista por imagen) u onnx (modelo local en CPU)
+    EMOTION_ENGINE: str = "auto"
+    # Si el motor no da resultado (sin cara, error de AWS...), responder con el mockup
+    EMOTION_ENGINE_FALLBACK_TO_MOCK: bool = True
+    # Latencia artificial del motor mock, para pruebas de carga
+    EMOTION_MOCK_LATENCY_MS: int = 0
+    # Motor local ONNX (requiere onnxruntime y numpy); por defecto un modelo estilo FER+
+    EMOTION_ONNX_MODEL_PATH: Optional[str] = None
+    EMOTION_ONNX_LABELS: str = "neutral,happiness,surprise,sadness,anger,disgust,fear,contempt"
+    EMOTION_ONNX_INPUT_SIZE: int = 64
+    # Hilos de inferencia en paralelo (0 = núcleos disponibles) y micro-batching
+    EMOTION_ONNX_WORKERS: int = 0
+    EMOTION_ONNX_MAX_BATCH: int = 8
+    EMOTION_ONNX_MAX_DELAY_MS: int = 10
+
+    # Caché de resultados de análisis de emociones
+    EMOTION_CACHE_ENABLED: bool = True
+    EMOTION_CACHE_TTL: int = 600
+    EMOTION_CACHE_MAX_ENTRIES: int = 2048
+    EMOTION_CACHE_MAX_BYTES: int = 4 * 1024 * 1024
+    # Coincidencia aproximada por dHash (0 desactiva la búsqueda perceptual)
+    EMOTION_CACHE_HAMMING_THRESHOLD: int = 4
 
     model_config = SettingsConfigDict(
         env_file = os.path.join(BASE_DIR, '.env'),
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.core.config import settings
+from server.core.security import verify_token
+from server.db.models.user import User
+from server.db.session import get_async_db
+from server.utils.cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """
+    Usuario autenticado (solo los campos que necesitan las rutas, sin la contraseña)
+    """
+    id: int
+    nombre: str
+    email: str
+    claims: Dict[str, Any] = field(default_factory=dict, compare=False)
+
+
+# Tokens ya verificados: sha256(token) -> CurrentUser. Evita decodificar el
+# JWT y consultar la BD en cada request autenticada.
+_user_cache: LRUTTLCache[str, CurrentUser] = LRUTTLCache(
+    ttl=settings.AUTH_USER_CACHE_TTL,
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """
+    Descarta los tokens cacheados de un usuario (tras cambiar perfil o contraseña)
+    """
+    for digest, user in list(_user_cache.items()):
+        if user.id == user_id:
+            _user_cache.delete(digest)
+
+
+async def _find_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def get_current_user(
+    authorization: str = Header(..., alias="Authorization"),
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
+    """
+    Resuelve el usuario del header `Authorization: Bearer <token>`
+    """
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Formato de token inválido"
+        )
+    token = authorization.split(" ")[1]
+    digest = token_digest(token)
+
+    cached = _user_cache.get(digest)
+    if cached is not None:
+        # La entrada no puede sobrevivir al token
+        if cached.claims.get("exp", float("inf")) > time.time():
+            return cached
+        _user_cache.delete(digest)
+
+    try:
+        payload = verify_token(token)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o expirado"
+        )
+
+    email = payload.get("sub")
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+
+    user = await _find_user_by_email(db, email)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
+    current_user = CurrentUser(id=user.id, nombre=user.nombre, email=user.email, claims=payload)
+    _user_cache.set(digest, current_user)
+    return current_user
+
+
+def is_app_token(authorization: Optional[str]) -> bool:
+    """
+    Si `Authorization` trae un JWT de la app (solo verifica la firma, sin BD)
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return False
+    try:
+        verify_token(authorization.split(" ")[1].strip())
+    except ValueError:
+        return False
+    return True
+
+
+async def get_optional_user(
+    authorization: Optional[str] = Header(None, alias="Authorization")
+) -> Optional[CurrentUser]:
+    """
+    Como get_current_user, pero None sin un token válido o si la BD falla
+    (rutas que no exigen sesión). La sesión de BD solo se abre si hace falta.
+    """
+    if not authorization:
+        return None
+    try:
+        async with asynccontextmanager(get_async_db)() as db:
+            return await get_current_user(authorization, db)
+    except HTTPException:
+        return None
+    except (SQLAlchemyError, OSError) as e:
+        logger.warning(f"No se pudo resolver el usuario del token, se sigue sin sesión: {e}")
+        return None
@@ -1,10 +1,15 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from server.core.config import settings
 
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """
     Hashea la contraseña usando bcrypt
     """
@@ -14,7 +19,7 @@ def hash_password(password: str) -> str:
     
     # Convertir a bytes y hashear
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     
     # Retornar como string para almacenar en la BD
@@ -36,6 +41,51 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    True si el hash se generó con menos rondas que BCRYPT_ROUNDS
+    """
+    try:
+        # Formato $2b$<rondas>$<salt+hash>
+        return int(hashed_password.split("$")[2]) < settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+# Pool dedicado para bcrypt: ~250 ms de CPU por hash no deben ocupar el
+# threadpool de AnyIO (que comparten todos los endpoints síncronos)
+_hash_executor: Optional[Executor] = None
+
+
+def _get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+        if settings.PASSWORD_HASH_USE_PROCESSES:
+            # spawn: el servidor ya tiene hilos vivos y fork no es seguro con ellos
+            _hash_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _hash_executor
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), hash_password, password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), verify_password, plain_password, hashed_password)
+
+
+def shutdown_hashing_pool() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
 # Generación de token JWT (sin cambios)
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
@@ -1,6 +1,10 @@
+import os
 from sqlalchemy import text
+from server.core.config import BASE_DIR
 from server.db.session import engine
 
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "migrations")
+
 def init_db_from_sql():
     sql_file_path = "server/schema.sql"
     with engine.connect() as connection:
@@ -8,4 +12,16 @@ def init_db_from_sql():
         with open(sql_file_path, "r", encoding="utf-8") as file:
             sql_script = file.read()
             connection.execute(text(sql_script))
-            connection.commit()
\ No newline at end of file
+            connection.commit()
+
+def apply_migrations():
+    """
+    Ejecuta en orden los .sql de server/migrations. Son idempotentes
+    (IF NOT EXISTS): ponen al día una base existente sin borrar datos.
+    """
+    names = sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+    with engine.begin() as connection:
+        for name in names:
+            with open(os.path.join(MIGRATIONS_DIR, name), "r", encoding="utf-8") as file:
+                connection.execute(text(file.read()))
+    print(f"🗄️ Migraciones aplicadas: {', '.join(names)}")
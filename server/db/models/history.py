@@ -0,0 +1,26 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Uuid
+from datetime import datetime
+from server.db.base import Base
+
+# Postgres guarda en minúsculas los nombres sin comillas de schema.sql
+# (ID_usuario -> id_usuario)
+
+class Emocion(Base):
+    __tablename__ = "emocion"
+
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column("id_usuario", Integer, ForeignKey('usuario.id', ondelete='CASCADE'), nullable=False)
+    nombre = Column(String(50), nullable=False)
+    confianza = Column(Float)
+    analisis_id = Column("id_analisis", Uuid, unique=True)
+    fecha_creacion = Column("fecha_creacion", DateTime, default=datetime.utcnow)
+
+
+class Cancion(Base):
+    __tablename__ = "cancion"
+
+    id = Column(Integer, primary_key=True, index=True)
+    emocion_id = Column("id_emocion", Integer, ForeignKey('emocion.id', ondelete='CASCADE'), nullable=False)
+    titulo = Column(String(100), nullable=False)
+    artista = Column(String(100))
+    album = Column(String(100))
@@ -1,17 +1,69 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+import time
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 from server.core.config import settings
 
+slow_query_logger = logging.getLogger("server.db.slow_query")
+
 # Ensure we use psycopg v3 driver
 db_url = settings.DATABASE_URL
 if db_url.startswith("postgresql://") and "+" not in db_url:
     db_url = db_url.replace("postgresql://", "postgresql+psycopg://", 1)
 
-engine = create_engine(
-    db_url,
-    pool_pre_ping=True,
-    echo=True
-)
+
+def engine_options() -> Dict[str, Any]:
+    """
+    Opciones del engine a partir de los DB_* de Settings
+    """
+    options: Dict[str, Any] = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if not db_url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    if db_url.startswith("postgresql") and settings.DB_STATEMENT_TIMEOUT_MS:
+        # Se fija al abrir la conexión: sin round trip extra por request
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def install_slow_query_log(target: Engine, threshold_ms: int) -> None:
+    """
+    Registra con WARNING las sentencias que superen `threshold_ms`
+    """
+    if threshold_ms <= 0:
+        return
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        if elapsed_ms >= threshold_ms:
+            # Sin parámetros: pueden contener datos personales
+            slow_query_logger.warning(f"Consulta lenta ({elapsed_ms:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    @event.listens_for(target, "handle_error")
+    def _discard_timer(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+engine = create_engine(db_url, **engine_options())
+install_slow_query_log(engine, settings.DB_SLOW_QUERY_MS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,4 +72,81 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+class ThreadedAsyncSession:
+    """
+    Respaldo de AsyncSession sobre la Session síncrona: misma interfaz (la
+    que usan los controladores) ejecutando cada operación en el threadpool
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        # Se leen todas las filas en el hilo, como el ScalarResult de AsyncSession
+        return await run_in_threadpool(lambda: self.sync_session.scalars(statement, *args, **kwargs).all())
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+# El engine async se crea al primer uso: requiere greenlet (sqlalchemy[asyncio])
+async_engine = None
+_async_sessionmaker = None
+
+
+def _get_async_sessionmaker():
+    global async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        # psycopg 3 sirve tanto para el engine síncrono como para el async
+        async_engine = create_async_engine(db_url, **engine_options())
+        install_slow_query_log(async_engine.sync_engine, settings.DB_SLOW_QUERY_MS)
+        # expire_on_commit=False: los objetos siguen legibles tras commit sin lazy loads
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def get_async_db() -> AsyncIterator:
+    if settings.DB_ASYNC_ENABLED:
+        async with _get_async_sessionmaker()() as db:
+            yield db
+        return
+
+    db = ThreadedAsyncSession(SessionLocal(expire_on_commit=False))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def dispose_async_engine() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
@@ -0,0 +1,97 @@
+import json
+import logging
+from typing import Dict, Optional
+
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class _BodyTooLarge(StarletteHTTPException):
+    """
+    Se lanza desde receive(); FastAPI la re-lanza al parsear el cuerpo y el
+    http_exception_handler la convierte en una respuesta 413
+    """
+
+    def __init__(self, max_body_size: int):
+        super().__init__(
+            status_code=413,
+            detail=f"El cuerpo de la solicitud excede el máximo de {max_body_size // (1024 * 1024)} MB"
+        )
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rechaza con 413 los cuerpos que superan el límite de su ruta, antes de
+    que FastAPI los parsee (multipart o JSON). `limits` asocia prefijos de
+    ruta a bytes máximos; gana el prefijo más largo.
+
+    Comprueba Content-Length si viene, y además cuenta los bytes a medida
+    que llegan para cubrir uploads chunked.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_body_size = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if max_body_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_large = int(value) > max_body_size
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    await self._reject(scope, send, max_body_size)
+                    return
+                break
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise _BodyTooLarge(max_body_size)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, send, max_body_size)
+
+    async def _reject(self, scope, send, max_body_size: int):
+        detail = _BodyTooLarge(max_body_size).detail
+        logger.error(f"HTTP error: {detail} - Path: {scope['path']}")
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
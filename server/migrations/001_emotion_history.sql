@@ -0,0 +1,8 @@
+-- Historial de emociones sobre una base creada con un schema.sql anterior.
+-- Idempotente: se aplica al iniciar (DB_MIGRATE_ON_STARTUP) o a mano con
+--   psql "$DATABASE_URL" -f server/migrations/001_emotion_history.sql
+ALTER TABLE emocion ADD COLUMN IF NOT EXISTS confianza REAL;
+ALTER TABLE emocion ADD COLUMN IF NOT EXISTS ID_analisis UUID UNIQUE;
+
+CREATE INDEX IF NOT EXISTS idx_emocion_usuario ON emocion(ID_usuario, id DESC);
+CREATE INDEX IF NOT EXISTS idx_cancion_emocion ON cancion(ID_emocion);
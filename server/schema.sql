@@ -1,3 +1,5 @@
+-- Crea la base desde cero (DB_INIT_ON_STARTUP). Los cambios posteriores a
+-- tablas existentes van también en server/migrations (idempotentes).
 DROP TABLE IF EXISTS usuario CASCADE;
 DROP TABLE IF EXISTS password_recovery CASCADE;
 DROP TABLE IF EXISTS emocion CASCADE;
@@ -15,6 +17,9 @@ CREATE TABLE emocion (
     id SERIAL PRIMARY KEY,
     ID_usuario INTEGER NOT NULL REFERENCES usuario(id) ON DELETE CASCADE,
     nombre VARCHAR(50) NOT NULL,
+    confianza REAL,
+    -- Lo genera el servidor al analizar; las canciones recomendadas lo referencian
+    ID_analisis UUID UNIQUE,
     Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -46,4 +51,8 @@ CREATE TABLE password_recovery (
 
 -- Índice para búsquedas rápidas
 CREATE INDEX idx_recovery_code ON password_recovery(code, user_id, is_used);
-CREATE INDEX idx_recovery_expires ON password_recovery(expires_at);
\ No newline at end of file
+CREATE INDEX idx_recovery_expires ON password_recovery(expires_at);
+
+-- Historial: paginación por (usuario, id) y canciones de cada emoción
+CREATE INDEX idx_emocion_usuario ON emocion(ID_usuario, id DESC);
+CREATE INDEX idx_cancion_emocion ON cancion(ID_emocion);
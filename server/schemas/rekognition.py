@@ -7,18 +7,21 @@ class FaceDetectionResponse(BaseModel):
     face_count: int
     faces: List[Dict[str, Any]]
     error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
 
 class LabelDetectionResponse(BaseModel):
     success: bool
     label_count: int
     labels: List[Dict[str, Any]]
     error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
 
 class TextDetectionResponse(BaseModel):
     success: bool
     text_count: int
     text_detections: List[Dict[str, Any]]
     error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
 
 class FaceComparisonResponse(BaseModel):
     success: bool
@@ -27,6 +30,7 @@ class FaceComparisonResponse(BaseModel):
     unmatched_faces: List[Dict[str, Any]]
     source_face_count: int
     error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
 
 class ModerationDetectionResponse(BaseModel):
     success: bool
@@ -34,6 +38,7 @@ class ModerationDetectionResponse(BaseModel):
     moderation_labels: List[Dict[str, Any]]
     inappropriate_score: float
     error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
 
 # Schemas para requests con valores por defecto de la configuración
 class DetectionParams(BaseModel):
@@ -1,11 +1,114 @@
+import asyncio
 import boto3
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
 from server.core.config import settings
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
+
+class RekognitionTimeoutError(Exception):
+    """La llamada a Rekognition superó AWS_REKOGNITION_CALL_TIMEOUT"""
+
+
+# Atributos de cara que se copian de la respuesta de AWS cuando vienen
+FACE_ATTRIBUTES = {
+    "age_range": "AgeRange",
+    "smile": "Smile",
+    "eyeglasses": "Eyeglasses",
+    "sunglasses": "Sunglasses",
+    "gender": "Gender",
+    "beard": "Beard",
+    "mustache": "Mustache",
+    "eyes_open": "EyesOpen",
+    "mouth_open": "MouthOpen",
+}
+
+
+@dataclass(slots=True)
+class FaceDetail:
+    confidence: float
+    bounding_box: Dict[str, float]
+    # Tipo de emoción de AWS (HAPPY, SAD, ...) -> confianza 0..100
+    emotions: Dict[str, float] = field(default_factory=dict)
+    # Solo los atributos pedidos en `attributes`
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bounding_box": self.bounding_box,
+            **self.attributes,
+            "emotions": [{"Type": typ, "Confidence": conf} for typ, conf in self.emotions.items()],
+            "confidence": self.confidence,
+        }
+
+
+@dataclass(slots=True)
+class FaceDetectionResult:
+    success: bool
+    faces: List[FaceDetail] = field(default_factory=list)
+    error: Optional[str] = None
+    raw_response: Optional[Dict[str, Any]] = None
+
+    @property
+    def face_count(self) -> int:
+        return len(self.faces)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "success": self.success,
+            "face_count": self.face_count,
+            "faces": [face.to_dict() for face in self.faces],
+        }
+        if self.error is not None:
+            result["error"] = self.error
+        if self.raw_response is not None:
+            result["raw_response"] = self.raw_response
+        return result
+
+
+# Peor caso del backoff del modo "standard" de botocore antes de cada
+# reintento: rand(0, 1) * min(2 ** intento, 20) segundos
+def _max_retry_backoff(attempts: int) -> float:
+    return float(sum(min(2 ** attempt, 20) for attempt in range(1, attempts)))
+
+
+def client_config() -> Config:
+    """
+    Config de boto3 cuyo peor caso (intentos x (conexión + lectura) + backoff)
+    cabe en AWS_REKOGNITION_CALL_TIMEOUT: una llamada que vence el wait_for
+    también termina en boto3 y libera su hilo del pool.
+    """
+    call_timeout = settings.AWS_REKOGNITION_CALL_TIMEOUT
+    attempts = max(settings.AWS_REKOGNITION_MAX_ATTEMPTS, 1)
+    # Sin al menos 1s por intento no vale la pena reintentar
+    while attempts > 1 and (call_timeout - _max_retry_backoff(attempts)) / attempts < 1.0:
+        attempts -= 1
+    per_attempt = (call_timeout - _max_retry_backoff(attempts)) / attempts
+    connect_timeout = min(settings.AWS_REKOGNITION_CONNECT_TIMEOUT, per_attempt / 2)
+    return Config(
+        max_pool_connections=settings.AWS_REKOGNITION_MAX_POOL_CONNECTIONS,
+        connect_timeout=connect_timeout,
+        read_timeout=min(settings.AWS_REKOGNITION_READ_TIMEOUT, per_attempt - connect_timeout),
+        retries={'max_attempts': attempts, 'mode': 'standard'}
+    )
+
+
+def _include_raw(include_raw: Optional[bool]) -> bool:
+    return settings.AWS_REKOGNITION_INCLUDE_RAW if include_raw is None else include_raw
+
+
+def _with_raw(result: Dict[str, Any], response: Dict[str, Any], include_raw: Optional[bool]) -> Dict[str, Any]:
+    if _include_raw(include_raw):
+        result["raw_response"] = response
+    return result
+
+
 class AWSRekognitionService:
     def __init__(self):
         try:
@@ -13,8 +116,12 @@ class AWSRekognitionService:
                 'rekognition',
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
+                region_name=settings.AWS_REGION,
+                config=client_config()
             )
+            # boto3 es síncrono: las llamadas corren en un pool acotado para
+            # no bloquear el event loop (se crea al primer uso, ver _get_executor)
+            self._executor: Optional[ThreadPoolExecutor] = None
             self.default_max_labels = settings.AWS_REKOGNITION_MAX_LABELS
             self.default_min_confidence = settings.AWS_REKOGNITION_MIN_CONFIDENCE
             self.default_similarity_threshold = settings.AWS_REKOGNITION_SIMILARITY_THRESHOLD
@@ -22,55 +129,79 @@ class AWSRekognitionService:
         except Exception as e:
             logger.error(f"Failed to initialize AWS Rekognition: {str(e)}")
             raise
+
+    async def _call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """
+        Ejecuta una operación de boto3 en el pool de Rekognition sin bloquear el event loop
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), partial(getattr(self.client, operation), **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=settings.AWS_REKOGNITION_CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RekognitionTimeoutError(
+                f"Rekognition {operation} excedió {settings.AWS_REKOGNITION_CALL_TIMEOUT}s"
+            )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.AWS_REKOGNITION_MAX_CONCURRENCY,
+                thread_name_prefix='rekognition'
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        # El próximo uso (otro lifespan en el mismo proceso) crea un pool nuevo
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
     
-    async def detect_faces(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def detect_faces(
+        self,
+        image_bytes: bytes,
+        attributes: Sequence[str] = ('ALL',),
+        include_raw: Optional[bool] = None
+    ) -> FaceDetectionResult:
         """
-        Detecta caras en una imagen con todos los atributos
+        Detecta caras en una imagen. `attributes` se pasa tal cual a AWS
+        (p. ej. ['EMOTIONS'] si solo interesan las emociones)
         """
         try:
-            response = self.client.detect_faces(
+            response = await self._call(
+                'detect_faces',
                 Image={'Bytes': image_bytes},
-                Attributes=['ALL']  # O puedes usar ['DEFAULT'] para menos atributos
+                Attributes=list(attributes)
             )
             
-            face_details = []
+            faces = []
             for face in response['FaceDetails']:
-                face_details.append({
-                    "bounding_box": face.get('BoundingBox', {}),
-                    "age_range": face.get('AgeRange', {}),
-                    "smile": face.get('Smile', {}),
-                    "eyeglasses": face.get('Eyeglasses', {}),
-                    "sunglasses": face.get('Sunglasses', {}),
-                    "gender": face.get('Gender', {}),
-                    "beard": face.get('Beard', {}),
-                    "mustache": face.get('Mustache', {}),
-                    "eyes_open": face.get('EyesOpen', {}),
-                    "mouth_open": face.get('MouthOpen', {}),
-                    "emotions": face.get('Emotions', []),
-                    "confidence": face.get('Confidence', 0)
-                })
+                faces.append(FaceDetail(
+                    confidence=face.get('Confidence', 0),
+                    bounding_box=face.get('BoundingBox', {}),
+                    emotions={e['Type']: e['Confidence'] for e in face.get('Emotions', [])},
+                    attributes={key: face[aws_key] for key, aws_key in FACE_ATTRIBUTES.items() if aws_key in face}
+                ))
             
-            return {
-                "success": True,
-                "face_count": len(response['FaceDetails']),
-                "faces": face_details,
-                "raw_response": response  # Opcional: incluir respuesta completa
-            }
-        except (BotoCoreError, ClientError) as e:
+            return FaceDetectionResult(
+                success=True,
+                faces=faces,
+                raw_response=response if _include_raw(include_raw) else None
+            )
+        except (BotoCoreError, ClientError, RekognitionTimeoutError) as e:
             logger.error(f"Error detecting faces: {str(e)}")
-            return {
-                "success": False,
-                "error": f"AWS Rekognition Error: {str(e)}",
-                "face_count": 0,
-                "faces": []
-            }
+            return FaceDetectionResult(
+                success=False,
+                error=f"AWS Rekognition Error: {str(e)}"
+            )
     
-    async def detect_labels(self, image_bytes: bytes, max_labels: Optional[int] = None, min_confidence: Optional[float] = None) -> Dict[str, Any]:
+    async def detect_labels(self, image_bytes: bytes, max_labels: Optional[int] = None, min_confidence: Optional[float] = None, include_raw: Optional[bool] = None) -> Dict[str, Any]:
         """
         Detecta etiquetas/objetos en una imagen
         """
         try:
-            response = self.client.detect_labels(
+            response = await self._call(
+                'detect_labels',
                 Image={'Bytes': image_bytes},
                 MaxLabels=max_labels or self.default_max_labels,
                 MinConfidence=min_confidence or self.default_min_confidence
@@ -85,13 +216,12 @@ class AWSRekognitionService:
                     "parents": [parent['Name'] for parent in label.get('Parents', [])]
                 })
             
-            return {
+            return _with_raw({
                 "success": True,
                 "label_count": len(response['Labels']),
-                "labels": labels,
-                "raw_response": response
-            }
-        except (BotoCoreError, ClientError) as e:
+                "labels": labels
+            }, response, include_raw)
+        except (BotoCoreError, ClientError, RekognitionTimeoutError) as e:
             logger.error(f"Error detecting labels: {str(e)}")
             return {
                 "success": False,
@@ -100,12 +230,13 @@ class AWSRekognitionService:
                 "labels": []
             }
     
-    async def detect_text(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def detect_text(self, image_bytes: bytes, include_raw: Optional[bool] = None) -> Dict[str, Any]:
         """
         Detecta texto en una imagen
         """
         try:
-            response = self.client.detect_text(
+            response = await self._call(
+                'detect_text',
                 Image={'Bytes': image_bytes}
             )
             
@@ -118,13 +249,12 @@ class AWSRekognitionService:
                     "bounding_box": detection.get('Geometry', {}).get('BoundingBox', {}) if detection.get('Geometry') else {}
                 })
             
-            return {
+            return _with_raw({
                 "success": True,
                 "text_count": len(response['TextDetections']),
-                "text_detections": text_detections,
-                "raw_response": response
-            }
-        except (BotoCoreError, ClientError) as e:
+                "text_detections": text_detections
+            }, response, include_raw)
+        except (BotoCoreError, ClientError, RekognitionTimeoutError) as e:
             logger.error(f"Error detecting text: {str(e)}")
             return {
                 "success": False,
@@ -133,12 +263,13 @@ class AWSRekognitionService:
                 "text_detections": []
             }
     
-    async def compare_faces(self, source_image_bytes: bytes, target_image_bytes: bytes, similarity_threshold: Optional[float] = None) -> Dict[str, Any]:
+    async def compare_faces(self, source_image_bytes: bytes, target_image_bytes: bytes, similarity_threshold: Optional[float] = None, include_raw: Optional[bool] = None) -> Dict[str, Any]:
         """
         Compara caras entre dos imágenes
         """
         try:
-            response = self.client.compare_faces(
+            response = await self._call(
+                'compare_faces',
                 SourceImage={'Bytes': source_image_bytes},
                 TargetImage={'Bytes': target_image_bytes},
                 SimilarityThreshold=similarity_threshold or self.default_similarity_threshold
@@ -160,15 +291,14 @@ class AWSRekognitionService:
                     "confidence": face.get('Confidence', 0)
                 })
             
-            return {
+            return _with_raw({
                 "success": True,
                 "match_count": len(response['FaceMatches']),
                 "matches": matches,
                 "unmatched_faces": unmatched_faces,
-                "source_face_count": len(response.get('SourceImageFace', {})),
-                "raw_response": response
-            }
-        except (BotoCoreError, ClientError) as e:
+                "source_face_count": len(response.get('SourceImageFace', {}))
+            }, response, include_raw)
+        except (BotoCoreError, ClientError, RekognitionTimeoutError) as e:
             logger.error(f"Error comparing faces: {str(e)}")
             return {
                 "success": False,
@@ -178,12 +308,13 @@ class AWSRekognitionService:
                 "unmatched_faces": []
             }
     
-    async def detect_moderation_labels(self, image_bytes: bytes, min_confidence: Optional[float] = None) -> Dict[str, Any]:
+    async def detect_moderation_labels(self, image_bytes: bytes, min_confidence: Optional[float] = None, include_raw: Optional[bool] = None) -> Dict[str, Any]:
         """
         Detecta contenido inapropiado en imágenes
         """
         try:
-            response = self.client.detect_moderation_labels(
+            response = await self._call(
+                'detect_moderation_labels',
                 Image={'Bytes': image_bytes},
                 MinConfidence=min_confidence or self.default_min_confidence
             )
@@ -197,14 +328,13 @@ class AWSRekognitionService:
                     "category": label.get('ParentName', '')  # Categoría principal
                 })
             
-            return {
+            return _with_raw({
                 "success": True,
                 "has_inappropriate_content": len(response['ModerationLabels']) > 0,
                 "moderation_labels": moderation_labels,
-                "inappropriate_score": max([label['Confidence'] for label in moderation_labels]) if moderation_labels else 0,
-                "raw_response": response
-            }
-        except (BotoCoreError, ClientError) as e:
+                "inappropriate_score": max([label['Confidence'] for label in moderation_labels]) if moderation_labels else 0
+            }, response, include_raw)
+        except (BotoCoreError, ClientError, RekognitionTimeoutError) as e:
             logger.error(f"Error detecting moderation labels: {str(e)}")
             return {
                 "success": False,
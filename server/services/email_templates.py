@@ -0,0 +1,82 @@
+import html
+import os
+import re
+from dataclasses import dataclass
+from string import Template
+from typing import Dict, List, Tuple
+
+from server.core.config import BASE_DIR
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates", "email")
+
+_LEADING_WHITESPACE = re.compile(r"^[ \t]+", re.MULTILINE)
+
+
+class CompiledTemplate:
+    """
+    Plantilla string.Template ($campo) partida una sola vez en trozos
+    estáticos y nombres de campo: renderizar es un join, sin volver a
+    escanear el documento en cada envío.
+    """
+
+    def __init__(self, source: str, escape: bool = False):
+        self.escape = escape
+        self._parts: List[Tuple[bool, str]] = []  # (es_campo, texto o nombre)
+        last = 0
+        for match in Template.pattern.finditer(source):
+            self._parts.append((False, source[last:match.start()]))
+            if match.group("escaped") is not None:
+                self._parts.append((False, "$"))
+            elif match.group("invalid") is not None:
+                raise ValueError(f"Marcador inválido en la plantilla, posición {match.start()}")
+            else:
+                self._parts.append((True, match.group("named") or match.group("braced")))
+            last = match.end()
+        self._parts.append((False, source[last:]))
+        self.fields = frozenset(value for is_field, value in self._parts if is_field)
+
+    def render(self, **values: str) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Faltan campos de la plantilla: {', '.join(sorted(missing))}")
+        if self.escape:
+            values = {key: html.escape(str(value)) for key, value in values.items()}
+        return "".join(values[value] if is_field else value for is_field, value in self._parts)
+
+
+@dataclass(frozen=True)
+class EmailTemplate:
+    subject: CompiledTemplate
+    text: CompiledTemplate
+    html: CompiledTemplate
+
+    def render(self, **values: str) -> Tuple[str, str, str]:
+        """
+        (asunto, texto plano, html) con los campos dinámicos
+        """
+        return self.subject.render(**values), self.text.render(**values), self.html.render(**values)
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(TEMPLATES_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def load_template(name: str, subject: str) -> EmailTemplate:
+    """
+    Carga `<name>.txt` y `<name>.html` de server/templates/email
+    """
+    # La indentación del HTML no cambia cómo se ve y solo engorda el correo
+    html_source = _LEADING_WHITESPACE.sub("", _read(f"{name}.html"))
+    return EmailTemplate(
+        subject=CompiledTemplate(subject),
+        text=CompiledTemplate(_read(f"{name}.txt")),
+        html=CompiledTemplate(html_source, escape=True),
+    )
+
+
+# Plantillas compiladas al importar el módulo (una vez por proceso)
+TEMPLATES: Dict[str, EmailTemplate] = {
+    "verification": load_template("verification", subject="Recuperación de contraseña - Ánima"),
+    "contact": load_template("contact", subject="Contacto Ánima: ${subject}"),
+}
@@ -0,0 +1,441 @@
+import asyncio
+import hashlib
+import random
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from server.core.config import settings
+from server.services.aws_rekognition_service import rekognition_service
+from server.services.emotion_cache import emotion_cache
+from server.services.face_prefilter import face_prefilter
+from server.utils.image import preprocess_image_async
+
+# Mapping from AWS Rekognition emotion types to our app emotion keys
+AWS_TO_APP = {
+    'HAPPY': 'happy',
+    'SAD': 'sad',
+    'ANGRY': 'angry',
+    'CALM': 'relaxed',
+    'SURPRISED': 'energetic',
+    'CONFUSED': 'relaxed',
+    'DISGUSTED': 'angry',
+    'FEAR': 'sad'
+}
+
+# 🎭 Datos mockup de emociones
+MOCK_EMOTIONS = {
+    "happy": {
+        "emotion": "happy",
+        "confidence": 0.87,
+        "emotions_detected": {
+            "happy": 0.87,
+            "relaxed": 0.06,
+            "sad": 0.03,
+            "angry": 0.02,
+            "energetic": 0.02
+        }
+    },
+    "sad": {
+        "emotion": "sad",
+        "confidence": 0.82,
+        "emotions_detected": {
+            "sad": 0.82,
+            "relaxed": 0.09,
+            "happy": 0.05,
+            "angry": 0.03,
+            "energetic": 0.01
+        }
+    },
+    "angry": {
+        "emotion": "angry",
+        "confidence": 0.79,
+        "emotions_detected": {
+            "angry": 0.79,
+            "energetic": 0.11,
+            "sad": 0.06,
+            "happy": 0.03,
+            "relaxed": 0.01
+        }
+    },
+    "relaxed": {
+        "emotion": "relaxed",
+        "confidence": 0.85,
+        "emotions_detected": {
+            "relaxed": 0.85,
+            "happy": 0.08,
+            "sad": 0.04,
+            "angry": 0.02,
+            "energetic": 0.01
+        }
+    },
+    "energetic": {
+        "emotion": "energetic",
+        "confidence": 0.83,
+        "emotions_detected": {
+            "energetic": 0.83,
+            "happy": 0.09,
+            "angry": 0.04,
+            "relaxed": 0.03,
+            "sad": 0.01
+        }
+    }
+}
+
+
+# Emociones de la app a las que se mapean las de Rekognition
+APP_EMOTIONS = tuple(sorted(set(AWS_TO_APP.values())))
+
+
+class EmotionAnalysisError(Exception):
+    """
+    Rekognition no pudo dar un resultado (error de AWS o ninguna cara)
+    """
+
+
+def aws_configured() -> bool:
+    return bool(getattr(settings, 'AWS_ACCESS_KEY_ID', None) and getattr(settings, 'AWS_SECRET_ACCESS_KEY', None))
+
+
+def map_aws_emotions(emotions: Dict[str, float]) -> Dict[str, float]:
+    """
+    Convierte las emociones de Rekognition ({'HAPPY': 0..100, ...}) a las
+    de la app, sumando las que caen en la misma clave y normalizando a 0..1
+    """
+    emotions_detected: Dict[str, float] = {}
+    for typ, conf in emotions.items():
+        key = AWS_TO_APP.get(typ.upper(), typ.lower())
+        emotions_detected[key] = emotions_detected.get(key, 0.0) + float(conf or 0.0) / 100.0
+
+    # Normalize after mapping and summing
+    mapped_total = sum(emotions_detected.values())
+    if mapped_total > 0:
+        for k in list(emotions_detected.keys()):
+            emotions_detected[k] = round(emotions_detected[k] / mapped_total, 3)
+    return emotions_detected
+
+
+def top_emotion(emotions_detected: Dict[str, float]) -> Tuple[Optional[str], float]:
+    if not emotions_detected:
+        return None, 0.0
+    app_top = max(emotions_detected, key=lambda k: emotions_detected[k])
+    return app_top, emotions_detected[app_top]
+
+
+# Valor de "engine" en los resultados mockup (motor mock o fallback)
+MOCK_ENGINE = "mock"
+
+
+def is_mock_result(result: Dict) -> bool:
+    """
+    Si el resultado salió del mockup (emociones aleatorias o por hash, no de una cara real)
+    """
+    return result.get("engine") == MOCK_ENGINE
+
+
+def mock_result() -> Dict:
+    emotion_key = random.choice(list(MOCK_EMOTIONS.keys()))
+    emotion_data = MOCK_EMOTIONS[emotion_key].copy()
+    emotion_data["timestamp"] = datetime.utcnow().isoformat()
+    emotion_data["message"] = "Análisis completado exitosamente (modo mockup)"
+    emotion_data["engine"] = MOCK_ENGINE
+    print(f"✅ Análisis mockup: {emotion_key} ({emotion_data['confidence']*100:.1f}%)")
+    return emotion_data
+
+
+async def analyze_with_rekognition(image_bytes: bytes) -> Dict:
+    """
+    Caché -> prefiltro local -> preprocesado -> DetectFaces -> normalización.
+    Lanza EmotionAnalysisError si no hay resultado utilizable.
+    """
+    # Mismo frame (o casi idéntico) analizado hace poco: no llamar a AWS
+    cache_key = None
+    if settings.EMOTION_CACHE_ENABLED:
+        cached, cache_key = await emotion_cache.lookup(image_bytes)
+        if cached is not None:
+            print(f"♻️ Análisis desde caché: {cached['emotion']} ({cached['confidence']*100:.1f}%)")
+            return {
+                **cached,
+                'timestamp': datetime.utcnow().isoformat(),
+                'message': 'Análisis completado exitosamente (AWS Rekognition, caché)',
+                'cache_hit': True
+            }
+
+    # Frames sin cara: se descartan en local sin llamar a AWS
+    crop = None
+    if settings.FACE_PREFILTER_ENABLED:
+        prefilter = await face_prefilter.check(image_bytes)
+        if prefilter.has_face is False:
+            raise EmotionAnalysisError('No faces detected (prefiltro local)')
+        crop = prefilter.crop
+
+    # Reducir (y recortar a la cara) y re-codificar antes de subir la imagen a AWS
+    bytes_saved = None
+    if settings.IMAGE_PREPROCESS_ENABLED or crop is not None:
+        try:
+            processed = await preprocess_image_async(image_bytes, crop=crop)
+            image_bytes = processed.data
+            bytes_saved = processed.bytes_saved
+            print(f"🗜️ Imagen preprocesada: {processed.original_size} -> {len(processed.data)} bytes ({processed.width}x{processed.height})")
+        except Exception as pe:
+            print(f"⚠️ No se pudo preprocesar la imagen, se envía la original: {pe}")
+
+    try:
+        # Solo se usan las emociones: no pedir el resto de atributos a AWS
+        result = await rekognition_service.detect_faces(image_bytes, attributes=['EMOTIONS'])
+    except (BotoCoreError, ClientError) as be:
+        raise EmotionAnalysisError(f"AWS Rekognition error: {be}")
+
+    if not result.success:
+        raise EmotionAnalysisError(result.error or 'AWS Rekognition returned an error')
+
+    if not result.faces:
+        raise EmotionAnalysisError('No faces detected')
+
+    # Use first face for emotion analysis
+    face = result.faces[0]
+    emotions_detected = map_aws_emotions(face.emotions)
+    app_top, top_conf = top_emotion(emotions_detected)
+
+    result_data = {
+        'emotion': app_top,
+        'confidence': round(top_conf, 4),
+        'emotions_detected': emotions_detected,
+        'face_confidence': round(float(face.confidence or 0.0) / 100.0, 4)
+    }
+    if cache_key is not None and app_top is not None:
+        emotion_cache.store(cache_key, result_data)
+
+    print(f"✅ Análisis Rekognition: {app_top} ({result_data['confidence']*100:.1f}%)")
+    return {
+        **result_data,
+        'timestamp': datetime.utcnow().isoformat(),
+        'message': 'Análisis completado exitosamente (AWS Rekognition)',
+        'bytes_saved': bytes_saved,
+        'cache_hit': False if cache_key is not None else None
+    }
+
+
+class EmotionEngine(ABC):
+    """
+    Backend de análisis de emociones. Las subclases implementan `_analyze`,
+    que devuelve el dict de resultado (emotion, confidence,
+    emotions_detected, ...) o lanza EmotionAnalysisError.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._stats = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    @abstractmethod
+    async def _analyze(self, image_bytes: bytes) -> Dict:
+        ...
+
+    async def analyze(self, image_bytes: bytes) -> Dict:
+        started = time.perf_counter()
+        try:
+            result = await self._analyze(image_bytes)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats["calls"] += 1
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed_ms)
+        result.setdefault("engine", self.name)
+        return result
+
+    def stats(self) -> Dict:
+        calls = self._stats["calls"]
+        return {
+            "engine": self.name,
+            "calls": calls,
+            "errors": self._stats["errors"],
+            "avg_ms": round(self._stats["total_ms"] / calls, 2) if calls else 0.0,
+            "max_ms": round(self._stats["max_ms"], 2),
+        }
+
+    def shutdown(self) -> None:
+        pass
+
+
+class RekognitionEmotionEngine(EmotionEngine):
+    name = "rekognition"
+
+    async def _analyze(self, image_bytes: bytes) -> Dict:
+        return await analyze_with_rekognition(image_bytes)
+
+
+class MockEmotionEngine(EmotionEngine):
+    """
+    Emociones mockup. Con `deterministic` la emoción depende del hash de la
+    imagen (misma imagen, mismo resultado), útil para pruebas de carga.
+    """
+
+    name = MOCK_ENGINE
+
+    def __init__(self, deterministic: bool = True, latency_ms: int = 0):
+        super().__init__()
+        self.deterministic = deterministic
+        self.latency_ms = latency_ms
+
+    async def _analyze(self, image_bytes: bytes) -> Dict:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if not self.deterministic:
+            return mock_result()
+
+        keys = list(MOCK_EMOTIONS.keys())
+        digest = hashlib.sha256(image_bytes).digest()
+        emotion_data = MOCK_EMOTIONS[keys[int.from_bytes(digest[:4], "big") % len(keys)]].copy()
+        emotion_data["timestamp"] = datetime.utcnow().isoformat()
+        emotion_data["message"] = "Análisis completado exitosamente (modo mockup)"
+        return emotion_data
+
+
+def build_emotion_engine(name: str) -> EmotionEngine:
+    name = (name or "auto").lower()
+    if name == "auto":
+        # Comportamiento histórico: Rekognition con credenciales, si no mockup aleatorio
+        if aws_configured():
+            return RekognitionEmotionEngine()
+        return MockEmotionEngine(deterministic=False, latency_ms=settings.EMOTION_MOCK_LATENCY_MS)
+    if name == "rekognition":
+        return RekognitionEmotionEngine()
+    if name == "mock":
+        return MockEmotionEngine(deterministic=True, latency_ms=settings.EMOTION_MOCK_LATENCY_MS)
+    if name == "onnx":
+        # onnxruntime es opcional: solo se importa si se elige este motor
+        from server.services.local_emotion_model import OnnxEmotionEngine
+        return OnnxEmotionEngine.from_settings()
+    raise ValueError(f"EMOTION_ENGINE desconocido: {name}")
+
+
+_engine: Optional[EmotionEngine] = None
+
+
+def get_emotion_engine() -> EmotionEngine:
+    global _engine
+    if _engine is None:
+        _engine = build_emotion_engine(settings.EMOTION_ENGINE)
+        print(f"🧠 Motor de emociones: {_engine.name}")
+    return _engine
+
+
+def shutdown_emotion_engine() -> None:
+    global _engine
+    if _engine is not None:
+        _engine.shutdown()
+        _engine = None
+
+
+async def analyze_frame(image_bytes: bytes) -> Dict:
+    """
+    Analiza con el motor configurado, sin fallback: lanza
+    EmotionAnalysisError si no hay resultado (p. ej. sin cara)
+    """
+    return await get_emotion_engine().analyze(image_bytes)
+
+
+async def analyze_image(image_bytes: bytes) -> Dict:
+    """
+    Pipeline compartido por las rutas de análisis: motor configurado
+    (EMOTION_ENGINE) y mockup si no da resultado
+    """
+    try:
+        return await analyze_frame(image_bytes)
+    except Exception as e:
+        if not settings.EMOTION_ENGINE_FALLBACK_TO_MOCK:
+            raise
+        print(f"❌ Error del motor de emociones: {e}")
+        # Fallthrough to mockup
+
+    return mock_result()
+
+
+async def analyze_images(images: Sequence[bytes], concurrency: int) -> List[Union[Dict, Exception]]:
+    """
+    Analiza varias imágenes en paralelo con como máximo `concurrency`
+    análisis a la vez. Devuelve, en el mismo orden, el resultado o la
+    excepción de cada imagen.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(image_bytes: bytes) -> Dict:
+        async with semaphore:
+            return await analyze_image(image_bytes)
+
+    return await asyncio.gather(*(run(image_bytes) for image_bytes in images), return_exceptions=True)
+
+
+def aggregate_emotions(results: Sequence[Dict]) -> Dict[str, float]:
+    """
+    Distribución media de emociones de un lote, ponderada por la confianza
+    de la cara (1.0 si no se conoce, p. ej. en modo mockup)
+    """
+    totals: Dict[str, float] = {}
+    total_weight = 0.0
+    for result in results:
+        weight = result.get('face_confidence') or 1.0
+        total_weight += weight
+        for emotion, value in result.get('emotions_detected', {}).items():
+            totals[emotion] = totals.get(emotion, 0.0) + value * weight
+
+    if total_weight <= 0:
+        return {}
+    return {emotion: round(value / total_weight, 3) for emotion, value in totals.items()}
+
+
+def best_frame(results: Sequence[Optional[Dict]]) -> Optional[int]:
+    """
+    Índice del frame con la cara más nítida (mayor confianza de cara);
+    a igualdad, el de la emoción más clara
+    """
+    best_index = None
+    best_key = None
+    for index, result in enumerate(results):
+        if not result:
+            continue
+        key = (result.get('face_confidence') or 0.0, result.get('confidence') or 0.0)
+        if best_key is None or key > best_key:
+            best_index, best_key = index, key
+    return best_index
+
+
+class EmotionSmoother:
+    """
+    Media móvil exponencial de la distribución de emociones de un stream
+    de frames: smoothed = alpha * frame + (1 - alpha) * smoothed
+    """
+
+    def __init__(self, alpha: float, emotions: Sequence[str] = APP_EMOTIONS):
+        self.alpha = min(max(alpha, 0.0), 1.0)
+        self.emotions = tuple(emotions)
+        self._state: Optional[Dict[str, float]] = None
+
+    @property
+    def distribution(self) -> Dict[str, float]:
+        return dict(self._state or {})
+
+    def reset(self) -> None:
+        self._state = None
+
+    def update(self, emotions_detected: Dict[str, float]) -> Dict[str, float]:
+        frame = {emotion: emotions_detected.get(emotion, 0.0) for emotion in self.emotions}
+        if self._state is None:
+            self._state = frame
+        else:
+            self._state = {
+                emotion: self.alpha * frame[emotion] + (1 - self.alpha) * self._state[emotion]
+                for emotion in self.emotions
+            }
+
+        total = sum(self._state.values())
+        if total > 0:
+            self._state = {emotion: value / total for emotion, value in self._state.items()}
+        return {emotion: round(value, 3) for emotion, value in self._state.items()}
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from server.core.config import settings
+from server.utils.cache import LRUTTLCache
+from server.utils.image import dhash_async
+
+logger = logging.getLogger(__name__)
+
+DHASH_BITS = 64
+
+# Ámbito de la caché en la request actual (id de usuario): las rutas de
+# análisis lo fijan para que un usuario no reciba resultados cacheados de otro
+cache_scope: ContextVar[Optional[str]] = ContextVar("emotion_cache_scope", default=None)
+
+
+@dataclass(frozen=True)
+class EmotionCacheKey:
+    digest: str
+    dhash: Optional[int] = None
+    scope: Optional[str] = None
+
+
+@dataclass
+class CachedEmotion:
+    dhash: Optional[int]
+    # emotion, confidence y emotions_detected ya normalizados
+    result: Dict
+    scope: Optional[str] = None
+
+
+def dhash_bands(threshold: int) -> List[Tuple[int, int]]:
+    """
+    (desplazamiento, máscara) de `threshold + 1` bandas que cubren el dHash.
+    Dos hashes a distancia <= threshold coinciden al menos en una banda
+    entera (principio del palomar), así que basta buscar en esas.
+    """
+    count = min(threshold + 1, DHASH_BITS)
+    width, extra = divmod(DHASH_BITS, count)
+    bands, shift = [], 0
+    for i in range(count):
+        bits = width + (1 if i < extra else 0)
+        bands.append((shift, (1 << bits) - 1))
+        shift += bits
+    return bands
+
+
+def _entry_size(entry: CachedEmotion) -> int:
+    return len(json.dumps(entry.result)) + 128
+
+
+class EmotionResultCache:
+    """
+    Caché de resultados de análisis de emociones direccionada por contenido.
+
+    Primero busca por SHA-256 de los bytes; si no hay coincidencia exacta y
+    `hamming_threshold` > 0, busca una imagen casi idéntica por dHash
+    (p. ej. el mismo frame reenviado al pulsar varias veces la cámara),
+    comparando solo las entradas que comparten alguna banda del hash.
+    Las entradas son de un ámbito (`cache_scope`, el usuario de la request).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, hamming_threshold: int):
+        self.hamming_threshold = hamming_threshold
+        self._bands = dhash_bands(hamming_threshold) if hamming_threshold > 0 else []
+        # (ámbito, banda, valor de la banda) -> claves con ese trozo de dHash
+        self._index: Dict[Tuple[Optional[str], int, int], Set[str]] = {}
+        self._store: LRUTTLCache[str, CachedEmotion] = LRUTTLCache(
+            ttl=ttl,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=_entry_size,
+            on_remove=self._unindex,
+        )
+        self._stats = {"lookups": 0, "exact_hits": 0, "perceptual_hits": 0, "misses": 0}
+
+    def _band_keys(self, scope: Optional[str], image_hash: int) -> Iterator[Tuple[Optional[str], int, int]]:
+        for band, (shift, mask) in enumerate(self._bands):
+            yield scope, band, (image_hash >> shift) & mask
+
+    def _unindex(self, key: str, entry: CachedEmotion) -> None:
+        if entry.dhash is None:
+            return
+        for band_key in self._band_keys(entry.scope, entry.dhash):
+            keys = self._index.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[band_key]
+
+    async def lookup(self, image_bytes: bytes) -> Tuple[Optional[Dict], EmotionCacheKey]:
+        """
+        Devuelve (resultado_cacheado o None, clave para guardar el resultado)
+        """
+        self._stats["lookups"] += 1
+        scope = cache_scope.get()
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        if scope is not None:
+            digest = f"{scope}:{digest}"
+
+        entry = self._store.get(digest)
+        if entry is not None:
+            self._stats["exact_hits"] += 1
+            return dict(entry.result), EmotionCacheKey(digest, entry.dhash, scope)
+
+        if self.hamming_threshold <= 0:
+            self._stats["misses"] += 1
+            return None, EmotionCacheKey(digest, scope=scope)
+
+        try:
+            image_hash = await dhash_async(image_bytes)
+        except Exception as e:
+            logger.warning(f"No se pudo calcular el dHash: {e}")
+            self._stats["misses"] += 1
+            return None, EmotionCacheKey(digest, scope=scope)
+
+        # Solo se comparan las entradas que comparten alguna banda, no toda la caché
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(scope, image_hash):
+            candidates.update(self._index.get(band_key, ()))
+
+        best: Optional[Tuple[int, str, CachedEmotion]] = None
+        for other_digest in candidates:
+            other = self._store.peek(other_digest)
+            if other is None or other.dhash is None:
+                continue
+            distance = (image_hash ^ other.dhash).bit_count()
+            if distance <= self.hamming_threshold and (best is None or distance < best[0]):
+                best = (distance, other_digest, other)
+                if distance == 0:
+                    break
+
+        if best is None:
+            self._stats["misses"] += 1
+            return None, EmotionCacheKey(digest, image_hash, scope)
+
+        # Refresca la posición LRU de la entrada encontrada
+        self._store.get(best[1])
+        self._stats["perceptual_hits"] += 1
+        return dict(best[2].result), EmotionCacheKey(digest, image_hash, scope)
+
+    def store(self, key: EmotionCacheKey, result: Dict) -> None:
+        self._store.set(key.digest, CachedEmotion(dhash=key.dhash, result=dict(result), scope=key.scope))
+        # Sin indexar si el propio set la desalojó (entrada mayor que max_bytes)
+        if key.dhash is not None and self._store.peek(key.digest) is not None:
+            for band_key in self._band_keys(key.scope, key.dhash):
+                self._index.setdefault(band_key, set()).add(key.digest)
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def stats(self) -> Dict[str, float]:
+        hits = self._stats["exact_hits"] + self._stats["perceptual_hits"]
+        lookups = self._stats["lookups"]
+        store = self._store.stats()
+        return dict(
+            self._stats,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            entries=store["entries"],
+            bytes=store["bytes"],
+            evictions=store["evictions"],
+            expirations=store["expirations"],
+        )
+
+
+# Instancia global de la caché
+emotion_cache = EmotionResultCache(
+    ttl=settings.EMOTION_CACHE_TTL,
+    max_entries=settings.EMOTION_CACHE_MAX_ENTRIES,
+    max_bytes=settings.EMOTION_CACHE_MAX_BYTES,
+    hamming_threshold=settings.EMOTION_CACHE_HAMMING_THRESHOLD,
+)
@@ -0,0 +1,138 @@
+import io
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from server.core.config import settings
+from server.utils.image import run_in_image_pool
+
+logger = logging.getLogger(__name__)
+
+# Caja relativa (left, top, right, bottom) en fracciones 0..1 de la imagen orientada
+RelativeBox = Tuple[float, float, float, float]
+
+
+@dataclass
+class PrefilterResult:
+    # None si el prefiltro no pudo decidir (OpenCV no instalado, error, ...)
+    has_face: Optional[bool]
+    crop: Optional[RelativeBox] = None
+
+
+class FacePrefilter:
+    """
+    Detector local de caras (cascada Haar de OpenCV, solo CPU) que se
+    ejecuta antes de Rekognition: descarta frames sin cara y devuelve la
+    caja de la cara más grande para recortar lo que se sube a AWS.
+
+    OpenCV es opcional; si no está instalado el prefiltro no decide y el
+    análisis sigue como siempre.
+    """
+
+    def __init__(self, cascade_path: Optional[str], detect_edge: int, min_face: int, crop_margin: float):
+        self.cascade_path = cascade_path
+        self.detect_edge = detect_edge
+        self.min_face = min_face
+        self.crop_margin = crop_margin
+        self._cv2 = None
+        self._available: Optional[bool] = None
+        # CascadeClassifier no es seguro entre hilos: uno por hilo del pool
+        self._local = threading.local()
+        self._stats = {"checked": 0, "rejected": 0, "cropped": 0, "undecided": 0}
+
+    @property
+    def available(self) -> bool:
+        if self._available is None:
+            try:
+                import cv2
+                import numpy  # noqa: F401
+            except ImportError:
+                logger.warning("OpenCV no instalado (opencv-python-headless), prefiltro de caras desactivado")
+                self._available = False
+            else:
+                # OpenCV 5 sacó las cascadas Haar del paquete principal
+                self._available = hasattr(cv2, "CascadeClassifier")
+                if not self._available:
+                    logger.warning(f"OpenCV {cv2.__version__} sin CascadeClassifier, prefiltro de caras desactivado")
+                self._cv2 = cv2
+        return self._available
+
+    def _classifier(self):
+        classifier = getattr(self._local, "classifier", None)
+        if classifier is None:
+            path = self.cascade_path or (self._cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+            classifier = self._cv2.CascadeClassifier(path)
+            if classifier.empty():
+                raise RuntimeError(f"No se pudo cargar la cascada {path}")
+            self._local.classifier = classifier
+        return classifier
+
+    def detect(self, image_bytes: bytes) -> Optional[RelativeBox]:
+        """
+        Caja relativa de la cara más grande (con margen) o None si no hay caras
+        """
+        import numpy as np
+
+        edge = self.detect_edge
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # Para detectar basta una versión pequeña en escala de grises
+            img.draft("L", (edge, edge))
+            img = ImageOps.exif_transpose(img)
+            gray = img.convert("L")
+            gray.thumbnail((edge, edge))
+            width, height = gray.size
+            pixels = np.asarray(gray)
+
+        faces = self._classifier().detectMultiScale(
+            pixels,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(self.min_face, self.min_face)
+        )
+        if len(faces) == 0:
+            return None
+
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        margin_x = w * self.crop_margin
+        margin_y = h * self.crop_margin
+        return (
+            max(0.0, (x - margin_x) / width),
+            max(0.0, (y - margin_y) / height),
+            min(1.0, (x + w + margin_x) / width),
+            min(1.0, (y + h + margin_y) / height),
+        )
+
+    async def check(self, image_bytes: bytes) -> PrefilterResult:
+        if not self.available:
+            self._stats["undecided"] += 1
+            return PrefilterResult(has_face=None)
+
+        self._stats["checked"] += 1
+        try:
+            crop = await run_in_image_pool(self.detect, image_bytes)
+        except Exception as e:
+            logger.warning(f"Error en el prefiltro de caras: {e}")
+            self._stats["undecided"] += 1
+            return PrefilterResult(has_face=None)
+
+        if crop is None:
+            self._stats["rejected"] += 1
+            return PrefilterResult(has_face=False)
+
+        self._stats["cropped"] += 1
+        return PrefilterResult(has_face=True, crop=crop)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, available=self.available)
+
+
+# Instancia global del prefiltro
+face_prefilter = FacePrefilter(
+    cascade_path=settings.FACE_PREFILTER_CASCADE_PATH,
+    detect_edge=settings.FACE_PREFILTER_DETECT_EDGE,
+    min_face=settings.FACE_PREFILTER_MIN_FACE,
+    crop_margin=settings.FACE_PREFILTER_CROP_MARGIN,
+)
@@ -0,0 +1,370 @@
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from server.core.config import settings
+from server.db.models.history import Cancion, Emocion
+from server.db.session import get_async_db
+from server.utils.cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia INSERT (lejos del límite de parámetros de Postgres y SQLite)
+INSERT_CHUNK_SIZE = 500
+
+# Errores de filas concretas (usuario borrado antes del flush, dato inválido):
+# reintentar no sirve, pero no deben tirar el resto del lote
+ROW_ERRORS = (IntegrityError, DataError)
+
+MAX_RETRY_DELAY = 60.0
+
+
+@dataclass
+class PendingAnalysis:
+    analisis_id: uuid.UUID
+    usuario_id: int
+    nombre: str
+    confianza: Optional[float]
+    fecha_creacion: datetime
+
+
+@dataclass
+class PendingTrack:
+    analisis_id: uuid.UUID
+    usuario_id: int
+    titulo: str
+    artista: Optional[str]
+    album: Optional[str]
+
+
+def _truncate(value, length: int) -> Optional[str]:
+    # Las columnas son VARCHAR: un título largo haría fallar el lote entero
+    return str(value)[:length] if value else None
+
+
+def track_row(analysis_id: uuid.UUID, user_id: int, track: Dict) -> Optional[PendingTrack]:
+    """
+    Fila de `cancion` a partir de una canción de /recommend (formato Spotify)
+    """
+    title = _truncate(track.get("name"), 100)
+    if not title:
+        return None
+    artists = ", ".join(
+        artist.get("name") for artist in track.get("artists") or []
+        if isinstance(artist, dict) and artist.get("name")
+    )
+    album = track.get("album")
+    return PendingTrack(
+        analisis_id=analysis_id,
+        usuario_id=user_id,
+        titulo=title,
+        artista=_truncate(artists, 100),
+        album=_truncate(album.get("name") if isinstance(album, dict) else album, 100),
+    )
+
+
+def _chunks(rows: List[Dict], size: int) -> Iterable[List[Dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class HistoryWriter:
+    """
+    Historial de emociones escrito fuera del camino de la request: los
+    endpoints solo agregan a un buffer en memoria y una tarea en segundo
+    plano lo escribe con INSERTs de varias filas cuando junta `batch_size`
+    registros o cada `flush_interval` segundos.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        analysis_ttl: float = 3600,
+        max_open_analyses: int = 10000,
+        retry_backoff: float = 1.0,
+        enabled: bool = True
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.enabled = enabled
+        # Escrituras fallidas seguidas (para el backoff)
+        self._failures = 0
+        # analysis_id emitido -> id del usuario dueño. Solo se aceptan canciones
+        # de análisis de esta tabla, de su dueño y una única vez.
+        self._open_analyses: LRUTTLCache[str, int] = LRUTTLCache(ttl=analysis_ttl, max_entries=max_open_analyses)
+        self._analyses: List[PendingAnalysis] = []
+        self._tracks: List[PendingTrack] = []
+        # Filas en el buffer por usuario, y usuarios con filas en la escritura en curso
+        self._pending_by_user: Counter = Counter()
+        self._writing_users: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {
+            "analyses": 0,
+            "tracks": 0,
+            "written": 0,
+            "batches": 0,
+            "failed": 0,
+            "retried": 0,
+            "dropped": 0,
+            "orphaned": 0,
+            "rejected": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._analyses) + len(self._tracks)
+
+    def has_pending(self, user_id: int) -> bool:
+        """
+        Si el usuario tiene registros sin escribir (en el buffer o en la escritura en curso)
+        """
+        return self._pending_by_user[user_id] > 0 or user_id in self._writing_users
+
+    def _ensure_started(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._flusher(), name="history-writer")
+
+    def _accept(self, count: int) -> bool:
+        if self.pending + count > self.max_pending:
+            self._stats["dropped"] += count
+            logger.warning(f"Buffer del historial lleno ({self.pending} pendientes), {count} registros descartados")
+            return False
+        self._ensure_started()
+        return True
+
+    def _buffered(self) -> None:
+        # Durante el backoff se espera al reintento aunque se llene el lote
+        if self.pending >= self.batch_size and not self._failures:
+            self._wakeup.set()
+
+    def record_analysis(self, user_id: int, emotion: str, confidence: Optional[float]) -> Optional[str]:
+        """
+        Registra un análisis; devuelve su id (para asociarle las canciones) o
+        None si el historial está desactivado o el buffer lleno
+        """
+        if not self.enabled or not self._accept(1):
+            return None
+        analysis_id = uuid.uuid4()
+        self._analyses.append(PendingAnalysis(
+            analisis_id=analysis_id,
+            usuario_id=user_id,
+            nombre=emotion,
+            confianza=confidence,
+            fecha_creacion=datetime.utcnow(),
+        ))
+        self._open_analyses.set(str(analysis_id), user_id)
+        self._pending_by_user[user_id] += 1
+        self._stats["analyses"] += 1
+        self._buffered()
+        return str(analysis_id)
+
+    def record_tracks(self, analysis_id: str, user_id: Optional[int], tracks: List[Dict]) -> int:
+        """
+        Registra las canciones recomendadas para un análisis del usuario;
+        devuelve cuántas. Ids desconocidos, caducados, de otro usuario o ya
+        usados se descartan sin llegar al buffer.
+        """
+        if not self.enabled:
+            return 0
+        try:
+            parsed_id = uuid.UUID(analysis_id)
+        except (TypeError, ValueError):
+            parsed_id = None
+        owner = self._open_analyses.get(str(parsed_id)) if parsed_id else None
+        if owner is None or owner != user_id:
+            self._stats["rejected"] += 1
+            return 0
+        rows = [row for row in (track_row(parsed_id, owner, track) for track in tracks) if row]
+        if not rows or not self._accept(len(rows)):
+            return 0
+        self._open_analyses.delete(str(parsed_id))
+        self._tracks.extend(rows)
+        self._pending_by_user[owner] += len(rows)
+        self._stats["tracks"] += len(rows)
+        self._buffered()
+        return len(rows)
+
+    def _retry_delay(self) -> float:
+        return min(self.retry_backoff * 2 ** max(self._failures - 1, 0), MAX_RETRY_DELAY)
+
+    async def _flusher(self) -> None:
+        while True:
+            timeout = self._retry_delay() if self._failures else self.flush_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Escribe lo pendiente en una transacción; devuelve las filas insertadas
+        """
+        if not self.pending or self._flush_lock is None:
+            return 0
+        async with self._flush_lock:
+            analyses, self._analyses = self._analyses, []
+            tracks, self._tracks = self._tracks, []
+            if not analyses and not tracks:
+                return 0
+            self._writing_users = set(self._pending_by_user)
+            self._pending_by_user = Counter()
+            try:
+                written = await self._write_batch(analyses, tracks)
+            except ROW_ERRORS as e:
+                logger.warning(f"Lote del historial rechazado ({e}), se escribe análisis por análisis")
+                written = await self._write_each(analyses, tracks)
+            except Exception as e:
+                self._retry_later(analyses, tracks, e)
+                return 0
+            else:
+                self._failures = 0
+            finally:
+                self._writing_users = set()
+            self._stats["written"] += written
+            self._stats["batches"] += 1
+            return written
+
+    async def _write_batch(self, analyses: List[PendingAnalysis], tracks: List[PendingTrack]) -> int:
+        async with self.session_factory() as db:
+            return await self._write(db, analyses, tracks)
+
+    async def _write_each(self, analyses: List[PendingAnalysis], tracks: List[PendingTrack]) -> int:
+        """
+        Respaldo tras un error de filas: cada análisis (con sus canciones) en su
+        propia transacción, para descartar solo los registros inválidos
+        """
+        by_analysis: Dict[uuid.UUID, List[PendingTrack]] = {}
+        for track in tracks:
+            by_analysis.setdefault(track.analisis_id, []).append(track)
+        units = [([analysis], by_analysis.pop(analysis.analisis_id, [])) for analysis in analyses]
+        # Canciones de análisis escritos en lotes anteriores
+        units.extend(([], unit_tracks) for unit_tracks in by_analysis.values())
+
+        written = 0
+        for index, (unit_analyses, unit_tracks) in enumerate(units):
+            try:
+                written += await self._write_batch(unit_analyses, unit_tracks)
+            except ROW_ERRORS as e:
+                self._stats["failed"] += len(unit_analyses) + len(unit_tracks)
+                logger.warning(f"Registro del historial descartado: {e}")
+            except Exception as e:
+                rest = units[index:]
+                self._retry_later(
+                    [analysis for unit_analyses, _ in rest for analysis in unit_analyses],
+                    [track for _, unit_tracks in rest for track in unit_tracks],
+                    e
+                )
+                return written
+        self._failures = 0
+        return written
+
+    def _retry_later(self, analyses: List[PendingAnalysis], tracks: List[PendingTrack], error: Exception) -> None:
+        """
+        Devuelve las filas al principio del buffer (hasta max_pending, primero
+        los análisis) para reintentarlas con backoff
+        """
+        room = max(self.max_pending - self.pending, 0)
+        kept_analyses = analyses[:room]
+        kept_tracks = tracks[:max(room - len(kept_analyses), 0)]
+        self._analyses[:0] = kept_analyses
+        self._tracks[:0] = kept_tracks
+        self._pending_by_user.update(row.usuario_id for row in kept_analyses)
+        self._pending_by_user.update(row.usuario_id for row in kept_tracks)
+        kept = len(kept_analyses) + len(kept_tracks)
+        self._stats["retried"] += kept
+        self._stats["dropped"] += len(analyses) + len(tracks) - kept
+        self._failures += 1
+        logger.warning(
+            f"Error guardando historial ({len(analyses)} análisis, {len(tracks)} canciones), "
+            f"reintento en {self._retry_delay():.1f}s: {error}"
+        )
+
+    async def _write(self, db, analyses: List[PendingAnalysis], tracks: List[PendingTrack]) -> int:
+        emotion_rows = [
+            {
+                "analisis_id": analysis.analisis_id,
+                "usuario_id": analysis.usuario_id,
+                "nombre": analysis.nombre,
+                "confianza": analysis.confianza,
+                "fecha_creacion": analysis.fecha_creacion,
+            }
+            for analysis in analyses
+        ]
+        for chunk in _chunks(emotion_rows, INSERT_CHUNK_SIZE):
+            await db.execute(insert(Emocion).values(chunk))
+
+        track_rows = []
+        if tracks:
+            # Los análisis pueden venir de este lote o de uno anterior: un solo
+            # SELECT resuelve el id de emocion de todas las canciones
+            result = await db.execute(
+                select(Emocion.analisis_id, Emocion.id)
+                .where(Emocion.analisis_id.in_({track.analisis_id for track in tracks}))
+            )
+            emotion_ids = dict(result.all())
+            track_rows = [
+                {
+                    "emocion_id": emotion_ids[track.analisis_id],
+                    "titulo": track.titulo,
+                    "artista": track.artista,
+                    "album": track.album,
+                }
+                for track in tracks
+                if track.analisis_id in emotion_ids
+            ]
+            # analysis_id desconocido (inventado, o su análisis no se pudo guardar)
+            self._stats["orphaned"] += len(tracks) - len(track_rows)
+            for chunk in _chunks(track_rows, INSERT_CHUNK_SIZE):
+                await db.execute(insert(Cancion).values(chunk))
+
+        await db.commit()
+        return len(emotion_rows) + len(track_rows)
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        # Con el lock tomado la tarea no está a mitad de una escritura
+        async with self._flush_lock:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        if self.pending:
+            logger.warning(f"Se apagó el historial con {self.pending} registros sin guardar")
+        self._task = self._wakeup = self._flush_lock = None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, pending=self.pending)
+
+
+# Instancia global del historial
+history_writer = HistoryWriter(
+    session_factory=asynccontextmanager(get_async_db),
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    max_pending=settings.HISTORY_MAX_PENDING,
+    analysis_ttl=settings.HISTORY_ANALYSIS_TTL,
+    max_open_analyses=settings.HISTORY_MAX_OPEN_ANALYSES,
+    retry_backoff=settings.HISTORY_RETRY_BACKOFF,
+    enabled=settings.HISTORY_ENABLED,
+)
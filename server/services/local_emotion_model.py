@@ -0,0 +1,223 @@
+import asyncio
+import io
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from PIL import Image, ImageOps
+
+from server.core.config import settings
+from server.services.emotion_analysis import EmotionAnalysisError, EmotionEngine, top_emotion
+from server.services.face_prefilter import RelativeBox, face_prefilter
+from server.utils.image import run_in_image_pool
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+except ImportError:  # pragma: no cover - dependencias opcionales
+    np = None
+    ort = None
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Clases de modelos estilo FER+ -> emociones de la app
+FER_TO_APP = {
+    "neutral": "relaxed",
+    "happiness": "happy",
+    "happy": "happy",
+    "surprise": "energetic",
+    "sadness": "sad",
+    "sad": "sad",
+    "anger": "angry",
+    "angry": "angry",
+    "disgust": "angry",
+    "fear": "sad",
+    "contempt": "angry",
+}
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Agrupa llamadas concurrentes en lotes de hasta `max_batch_size`
+    elementos, esperando como mucho `max_delay` segundos a que se llene el
+    lote. Cada lote se ejecuta con `run_batch` en `executor`, así que varios
+    lotes pueden procesarse a la vez (uno por hilo del pool).
+    """
+
+    def __init__(self, run_batch: Callable[[List[T]], List[R]], max_batch_size: int, max_delay: float, executor: Executor):
+        self.run_batch = run_batch
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_delay = max_delay
+        self.executor = executor
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {"batches": 0, "items": 0}
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self._stats["batches"] += 1
+        self._stats["items"] += len(batch)
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, self.run_batch, [item for item, _ in batch])
+
+        def deliver(done: asyncio.Future) -> None:
+            if done.cancelled():
+                for _, future in batch:
+                    if not future.done():
+                        future.cancel()
+                return
+            error = done.exception()
+            results = None if error else done.result()
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[index])
+
+        task.add_done_callback(deliver)
+
+    def stats(self) -> Dict:
+        batches = self._stats["batches"]
+        return dict(self._stats, avg_batch_size=round(self._stats["items"] / batches, 2) if batches else 0.0)
+
+
+class OnnxEmotionEngine(EmotionEngine):
+    """
+    Clasificador de emociones local en CPU con onnxruntime (modelo estilo
+    FER+: cara en escala de grises NxN -> logits por clase).
+
+    Las peticiones concurrentes se agrupan con MicroBatcher y los lotes se
+    reparten entre `workers` hilos, así que el throughput escala con los
+    núcleos. Con el prefiltro de caras activo se recorta a la cara más grande.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_path: str,
+        labels: Sequence[str],
+        input_size: int,
+        workers: int,
+        max_batch_size: int,
+        max_delay: float
+    ):
+        super().__init__()
+        if ort is None or np is None:
+            raise RuntimeError("EMOTION_ENGINE=onnx requiere los paquetes onnxruntime y numpy")
+        if not model_path or not os.path.exists(model_path):
+            raise RuntimeError(f"Modelo ONNX no encontrado: {model_path}")
+
+        self.labels = tuple(labels)
+        self.input_size = input_size
+        workers = workers or os.cpu_count() or 1
+
+        options = ort.SessionOptions()
+        # El paralelismo viene de los lotes concurrentes, no de cada inferencia
+        options.intra_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Algunos modelos (p. ej. FER+ del ONNX Model Zoo) tienen batch fijo de 1
+        self._fixed_batch = model_input.shape[0] == 1
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="emotion-onnx")
+        # Los lotes reciben tensores ya decodificados (ver _analyze)
+        self._batcher: MicroBatcher["np.ndarray", List[float]] = MicroBatcher(
+            self._run_batch,
+            max_batch_size=max_batch_size,
+            max_delay=max_delay,
+            executor=self._executor
+        )
+
+    @classmethod
+    def from_settings(cls) -> "OnnxEmotionEngine":
+        return cls(
+            model_path=settings.EMOTION_ONNX_MODEL_PATH,
+            labels=[label.strip() for label in settings.EMOTION_ONNX_LABELS.split(",") if label.strip()],
+            input_size=settings.EMOTION_ONNX_INPUT_SIZE,
+            workers=settings.EMOTION_ONNX_WORKERS,
+            max_batch_size=settings.EMOTION_ONNX_MAX_BATCH,
+            max_delay=settings.EMOTION_ONNX_MAX_DELAY_MS / 1000
+        )
+
+    def _to_tensor(self, image_bytes: bytes, crop: Optional[RelativeBox]):
+        size = self.input_size
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            if crop is None:
+                img.draft("L", (size * 4, size * 4))
+            img = ImageOps.exif_transpose(img)
+            if crop is not None:
+                width, height = img.size
+                left, top, right, bottom = crop
+                img = img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+            gray = img.convert("L").resize((size, size), Image.Resampling.BILINEAR)
+        return np.asarray(gray, dtype=np.float32).reshape(1, size, size)
+
+    def _run_batch(self, items: List["np.ndarray"]) -> List[List[float]]:
+        batch = np.stack(items)
+        if self._fixed_batch:
+            logits = np.concatenate([self._session.run(None, {self._input_name: batch[i:i + 1]})[0] for i in range(len(items))])
+        else:
+            logits = self._session.run(None, {self._input_name: batch})[0]
+        logits = logits.reshape(len(items), -1)
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return (exp / exp.sum(axis=1, keepdims=True)).tolist()
+
+    async def _analyze(self, image_bytes: bytes) -> Dict:
+        crop = None
+        if settings.FACE_PREFILTER_ENABLED:
+            prefilter = await face_prefilter.check(image_bytes)
+            if prefilter.has_face is False:
+                raise EmotionAnalysisError('No faces detected (prefiltro local)')
+            crop = prefilter.crop
+
+        # Cada imagen se decodifica por separado: una imagen truncada o
+        # corrupta falla solo su request, no el lote de otros usuarios
+        try:
+            tensor = await run_in_image_pool(self._to_tensor, image_bytes, crop)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise EmotionAnalysisError(f"No se pudo decodificar la imagen: {e}")
+
+        probabilities = await self._batcher.submit(tensor)
+
+        emotions_detected: Dict[str, float] = {}
+        for label, probability in zip(self.labels, probabilities):
+            key = FER_TO_APP.get(label.lower(), label.lower())
+            emotions_detected[key] = emotions_detected.get(key, 0.0) + probability
+        emotions_detected = {key: round(value, 3) for key, value in emotions_detected.items()}
+        app_top, top_conf = top_emotion(emotions_detected)
+
+        return {
+            'emotion': app_top,
+            'confidence': round(top_conf, 4),
+            'emotions_detected': emotions_detected,
+            'timestamp': datetime.utcnow().isoformat(),
+            'message': 'Análisis completado exitosamente (modelo local)'
+        }
+
+    def stats(self) -> Dict:
+        return dict(super().stats(), **self._batcher.stats())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import smtplib
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from email.message import Message
+from typing import Dict, List, Optional
+
+from server.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errores que no se arreglan reintentando (destinatario o remitente rechazados, auth)
+PERMANENT_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPNotSupportedError,
+)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    # Un 5xx (p. ej. 554 en DATA) tampoco se arregla reintentando; los 4xx sí
+    if isinstance(error, PERMANENT_ERRORS):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+@dataclass
+class OutboundMail:
+    message: Message
+    attempts: int = 0
+
+
+class SMTPConnection:
+    """
+    Conexión SMTP autenticada que se reutiliza entre mensajes. Se reabre si
+    el servidor la cerró o si estuvo inactiva más de `max_idle` segundos.
+    Los métodos son bloqueantes: se llaman desde el pool de hilos de la cola.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_ssl: bool,
+        starttls: bool,
+        username: Optional[str],
+        password: Optional[str],
+        timeout: float,
+        max_idle: float
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.opened = 0
+
+    def _open(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            if self.username:
+                smtp.login(self.username, self.password or "")
+        except Exception:
+            smtp.close()
+            raise
+        self.opened += 1
+        return smtp
+
+    def send(self, message: Message) -> None:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.max_idle:
+            self.close()
+        if self._smtp is None:
+            self._smtp = self._open()
+        try:
+            self._smtp.send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # El servidor respondió: la conexión sigue sirviendo
+            self._last_used = time.monotonic()
+            raise
+        except OSError:
+            # Desconexión o error de red (SMTPServerDisconnected incluido): se
+            # descarta la conexión y el reintento abre otra
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+
+class MailQueue:
+    """
+    Cola de correo saliente: los endpoints encolan y responden enseguida;
+    `workers` tareas en segundo plano envían con una conexión SMTP propia
+    cada una, reintentando con backoff exponencial los errores temporales.
+    """
+
+    def __init__(
+        self,
+        connection_factory,
+        max_size: int,
+        workers: int,
+        max_retries: int,
+        retry_backoff: float
+    ):
+        self.connection_factory = connection_factory
+        self.max_size = max_size
+        self.workers = max(workers, 1)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._connections: List[SMTPConnection] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._opened_before = 0
+        self._stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "rejected": 0}
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="smtp")
+        for i in range(self.workers):
+            connection = self.connection_factory()
+            self._connections.append(connection)
+            self._tasks.append(asyncio.create_task(self._worker(connection), name=f"mail-worker-{i}"))
+
+    def enqueue(self, message: Message) -> bool:
+        """
+        Encola un mensaje; False si la cola está llena
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(OutboundMail(message))
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            logger.warning(f"Cola de correo llena, mensaje a {message['To']} descartado")
+            return False
+        self._stats["enqueued"] += 1
+        return True
+
+    async def _worker(self, connection: SMTPConnection) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            mail = await self._queue.get()
+            try:
+                while True:
+                    mail.attempts += 1
+                    try:
+                        await loop.run_in_executor(self._executor, connection.send, mail.message)
+                    except Exception as e:
+                        if is_permanent_error(e):
+                            self._stats["failed"] += 1
+                            print(f"❌ Error enviando email a {mail.message['To']}: {e}")
+                            break
+                        if mail.attempts > self.max_retries:
+                            self._stats["failed"] += 1
+                            print(f"❌ Error enviando email a {mail.message['To']} tras {mail.attempts} intentos: {e}")
+                            break
+                        self._stats["retried"] += 1
+                        delay = self.retry_backoff * 2 ** (mail.attempts - 1)
+                        logger.warning(f"Envío de email fallido ({e}), reintento en {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                    else:
+                        self._stats["sent"] += 1
+                        print(f"✅ Email enviado exitosamente a {mail.message['To']}")
+                        break
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se envíen (o fallen) los mensajes encolados
+        """
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def aclose(self, timeout: float = 0) -> None:
+        if not self._tasks:
+            return
+        drained = await self.drain(timeout) if timeout else self._queue.empty()
+        if not drained:
+            logger.warning(f"Se apagó la cola de correo con {self._queue.qsize()} mensajes pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        # Cancelar la tarea no detiene un send_message ya en un hilo: se espera
+        # a que termine antes de cerrar su conexión (smtplib no es thread-safe)
+        await loop.run_in_executor(None, partial(self._executor.shutdown, wait=True))
+        for connection in self._connections:
+            await loop.run_in_executor(None, connection.close)
+        self._opened_before += sum(connection.opened for connection in self._connections)
+        self._tasks, self._connections = [], []
+        self._queue = self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(
+            self._stats,
+            pending=self._queue.qsize() if self._queue is not None else 0,
+            connections_opened=self._opened_before + sum(connection.opened for connection in self._connections),
+        )
+
+
+def _connection_from_settings() -> SMTPConnection:
+    return SMTPConnection(
+        host=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        use_ssl=settings.SMTP_USE_SSL,
+        starttls=settings.SMTP_STARTTLS,
+        username=settings.EMAIL_SENDER if settings.SMTP_LOGIN else None,
+        password=settings.EMAIL_PASSWORD if settings.SMTP_LOGIN else None,
+        timeout=settings.SMTP_TIMEOUT,
+        max_idle=settings.SMTP_MAX_IDLE,
+    )
+
+
+# Instancia global de la cola
+mail_queue = MailQueue(
+    connection_factory=_connection_from_settings,
+    max_size=settings.MAIL_QUEUE_MAX_SIZE,
+    workers=settings.MAIL_WORKERS,
+    max_retries=settings.MAIL_MAX_RETRIES,
+    retry_backoff=settings.MAIL_RETRY_BACKOFF,
+)
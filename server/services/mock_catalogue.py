@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from server.core.config import BASE_DIR, settings
+from server.services.track_selection import EMOTION_TO_GENRES
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = ("happy", "sad", "angry", "relaxed", "energetic")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(BASE_DIR), "recomendacionesSpotify.json")
+
+# Rangos (valence, energy) de las audio features de Spotify (0..1) por emoción;
+# una canción puede caer en varias
+AUDIO_FEATURE_RULES = {
+    "happy": ((0.6, 1.0), (0.4, 1.0)),
+    "sad": ((0.0, 0.4), (0.0, 0.5)),
+    "angry": ((0.0, 0.4), (0.6, 1.0)),
+    "relaxed": ((0.4, 1.0), (0.0, 0.5)),
+    "energetic": ((0.0, 1.0), (0.75, 1.0)),
+}
+
+
+def generate_fallback_data() -> Dict:
+    """Datos de respaldo si no se encuentra el JSON"""
+    return {
+        "tracks": [
+            {
+                "name": "Happy Song",
+                "artists": [{"name": "Artist Name"}],
+                "album": {
+                    "name": "Album Name",
+                    "images": [{"url": "https://via.placeholder.com/300"}]
+                },
+                "external_urls": {"spotify": "https://open.spotify.com"},
+                "duration_ms": 180000,
+                "popularity": 75
+            }
+        ] * 10,
+        "emotion": "happy",
+        "total_tracks": 10,
+        "search_method": "fallback"
+    }
+
+
+@dataclass(frozen=True)
+class CatalogueSnapshot:
+    """
+    Catálogo inmutable: las canciones en una tupla y, por emoción, una tupla
+    con los índices de sus canciones. Los dicts de canción se comparten
+    entre requests y no deben modificarse.
+    """
+    tracks: Tuple[Dict, ...]
+    by_emotion: Mapping[str, Tuple[int, ...]]
+    source: str
+    mtime: Optional[float]
+    # Emociones sin canciones propias, que usan el catálogo completo
+    unpartitioned: FrozenSet[str] = frozenset()
+
+
+_GENRE_SEPARATORS = re.compile(r"[\s\-_]+")
+
+
+def _compact_genre(genre: str) -> str:
+    return _GENRE_SEPARATORS.sub("", genre.lower())
+
+
+# Palabras clave sin separadores: "hard rock", "nu metal", "metalcore" o
+# "indie pop" (géneros de artista de Spotify) también coinciden
+_GENRE_KEYWORDS = {
+    emotion: tuple(_compact_genre(genre) for genre in genres)
+    for emotion, genres in EMOTION_TO_GENRES.items()
+}
+
+
+def _track_genres(track: Dict) -> Set[str]:
+    genres = list(track.get("genres") or [])
+    if isinstance(track.get("genre"), str):
+        genres.append(track["genre"])
+    for artist in track.get("artists") or []:
+        if isinstance(artist, dict):
+            genres.extend(artist.get("genres") or [])
+    return {_compact_genre(genre) for genre in genres if isinstance(genre, str)}
+
+
+def track_emotions(track: Dict) -> Set[str]:
+    """
+    Emociones de una canción del JSON, por orden de preferencia: etiquetas
+    explícitas (emotion / emotions / tags), audio features (valence y
+    energy) o géneros
+    """
+    labels = list(track.get("emotions") or []) + list(track.get("tags") or [])
+    if isinstance(track.get("emotion"), str):
+        labels.append(track["emotion"])
+    found = {label.lower() for label in labels if isinstance(label, str) and label.lower() in EMOTIONS}
+    if found:
+        return found
+
+    features = track.get("audio_features")
+    if not isinstance(features, dict):
+        features = track
+    valence, energy = features.get("valence"), features.get("energy")
+    if isinstance(valence, (int, float)) and isinstance(energy, (int, float)):
+        found = {
+            emotion
+            for emotion, ((valence_min, valence_max), (energy_min, energy_max)) in AUDIO_FEATURE_RULES.items()
+            if valence_min <= valence <= valence_max and energy_min <= energy <= energy_max
+        }
+        if found:
+            return found
+
+    genres = _track_genres(track)
+    return {
+        emotion
+        for emotion, keywords in _GENRE_KEYWORDS.items()
+        if any(keyword in genre for genre in genres for keyword in keywords)
+    }
+
+
+def build_snapshot(data: Dict, source: str, mtime: Optional[float]) -> CatalogueSnapshot:
+    tracks = tuple(track for track in data.get("tracks", []) if isinstance(track, dict))
+    partitions: Dict[str, List[int]] = {emotion: [] for emotion in EMOTIONS}
+    for index, track in enumerate(tracks):
+        for emotion in track_emotions(track):
+            partitions[emotion].append(index)
+
+    # Emociones sin canciones clasificadas: catálogo completo, como antes
+    all_indices = tuple(range(len(tracks)))
+    unpartitioned = frozenset(emotion for emotion, indices in partitions.items() if not indices)
+    return CatalogueSnapshot(
+        tracks=tracks,
+        by_emotion={
+            emotion: all_indices if emotion in unpartitioned else tuple(indices)
+            for emotion, indices in partitions.items()
+        },
+        source=source,
+        mtime=mtime,
+        unpartitioned=unpartitioned,
+    )
+
+
+class MockCatalogue:
+    """
+    Catálogo mockup cargado una vez por proceso. Con `reload` activo se
+    vuelve a leer el JSON cuando cambia su mtime; el snapshot se reemplaza
+    entero, así que las requests en curso siguen con el anterior.
+    """
+
+    def __init__(self, path: str, reload: bool, reload_interval: float):
+        self.path = path
+        self.reload = reload
+        self.reload_interval = reload_interval
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _load(self, mtime: Optional[float]) -> CatalogueSnapshot:
+        if mtime is None:
+            return build_snapshot(generate_fallback_data(), source="fallback", mtime=None)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            snapshot = build_snapshot(data, source=self.path, mtime=mtime)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            if self._snapshot is not None:
+                # JSON a medio escribir (o con otra estructura) durante una recarga: se mantiene el anterior
+                logger.warning(f"No se pudo recargar el catálogo mockup ({e}), se mantiene el anterior")
+                return self._snapshot
+            logger.warning(f"No se pudo leer el catálogo mockup ({e}), se usan datos de respaldo")
+            return build_snapshot(generate_fallback_data(), source="fallback", mtime=None)
+        counts = ", ".join(f"{emotion}={len(indices)}" for emotion, indices in snapshot.by_emotion.items())
+        print(f"🎵 Catálogo mockup cargado: {len(snapshot.tracks)} canciones ({counts})")
+        return snapshot
+
+    def snapshot(self) -> CatalogueSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and not self.reload:
+            return snapshot
+
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.reload_interval:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                mtime = self._mtime()
+                if self._snapshot is None or mtime != self._snapshot.mtime:
+                    self._snapshot = self._load(mtime)
+            return self._snapshot
+
+    def sample(self, emotion: str, k: int) -> List[Dict]:
+        """
+        Hasta `k` canciones al azar de la emoción, sin modificar el catálogo (O(k))
+        """
+        snapshot = self.snapshot()
+        indices = snapshot.by_emotion.get(emotion, ())
+        return [snapshot.tracks[i] for i in random.sample(indices, min(k, len(indices)))]
+
+
+# Instancia global del catálogo
+mock_catalogue = MockCatalogue(
+    path=settings.MOCK_CATALOGUE_PATH or DEFAULT_PATH,
+    reload=settings.MOCK_CATALOGUE_RELOAD,
+    reload_interval=settings.MOCK_CATALOGUE_RELOAD_INTERVAL,
+)
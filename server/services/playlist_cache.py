@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from server.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Un loader devuelve (canciones normalizadas, crawl_completo)
+PlaylistLoader = Callable[[str], Awaitable[Tuple[List[Dict], bool]]]
+
+
+@dataclass
+class CachedPlaylist:
+    tracks: List[Dict]
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class PlaylistTrackCache:
+    """
+    Caché de proceso (opcionalmente respaldada en Redis) con las canciones
+    normalizadas de cada playlist de emociones.
+
+    Las playlists son las mismas para todos los usuarios, así que basta con
+    recorrerlas una vez por TTL. Cada entrada se refresca en segundo plano
+    `refresh_margin` segundos antes de caducar.
+    """
+
+    def __init__(self, ttl: float, refresh_margin: float, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self._entries: Dict[str, CachedPlaylist] = {}
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        # Cargas en curso por playlist: los misses simultáneos esperan la misma
+        self._loads: Dict[str, asyncio.Task] = {}
+        self._redis_url = redis_url
+        self._redis = None
+
+    @staticmethod
+    def _key(playlist_id: str) -> str:
+        return f"spotify:playlist:{playlist_id}:tracks"
+
+    def _redis_client(self):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                logger.warning("Paquete redis no instalado, la caché de playlists será solo en memoria")
+                self._redis_url = None
+                return None
+            self._redis = redis.from_url(self._redis_url)
+        return self._redis
+
+    async def _read(self, playlist_id: str) -> Optional[CachedPlaylist]:
+        entry = self._entries.get(playlist_id)
+        if entry and entry.age < self.ttl:
+            return entry
+
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self._key(playlist_id))
+        except Exception as e:
+            logger.warning(f"Error leyendo playlist {playlist_id} de Redis: {e}")
+            return None
+        if not raw:
+            return None
+
+        data = json.loads(raw)
+        entry = CachedPlaylist(tracks=data["tracks"], fetched_at=data["fetched_at"])
+        if entry.age >= self.ttl:
+            return None
+        self._entries[playlist_id] = entry
+        return entry
+
+    async def _store(self, playlist_id: str, entry: CachedPlaylist) -> None:
+        self._entries[playlist_id] = entry
+
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            payload = json.dumps({"tracks": entry.tracks, "fetched_at": entry.fetched_at})
+            await client.set(self._key(playlist_id), payload, ex=int(self.ttl))
+        except Exception as e:
+            logger.warning(f"Error guardando playlist {playlist_id} en Redis: {e}")
+
+    async def get(
+        self,
+        playlist_id: str,
+        loader: PlaylistLoader,
+        refresher: Optional[PlaylistLoader] = None,
+    ) -> Tuple[List[Dict], bool, float]:
+        """
+        Devuelve (canciones, hit, edad_en_segundos).
+
+        En un miss se usa `loader`, una sola vez por playlist aunque lleguen
+        varios misses a la vez; solo se guardan crawls completos y no vacíos. `refresher` (normalmente con token de aplicación) mantiene la
+        entrada caliente en segundo plano.
+        """
+        entry = await self._read(playlist_id)
+        if entry is not None:
+            self._schedule_refresh(playlist_id, refresher, entry)
+            return entry.tracks, True, entry.age
+
+        task = self._loads.get(playlist_id)
+        shared = task is not None
+        if not shared:
+            task = asyncio.create_task(self._load(playlist_id, loader, refresher))
+            self._loads[playlist_id] = task
+            task.add_done_callback(lambda t, playlist_id=playlist_id: self._forget_load(playlist_id, t))
+        try:
+            # shield: si un llamador se cancela, los demás siguen esperando la misma carga
+            tracks = await asyncio.shield(task)
+        except Exception:
+            if not shared:
+                raise
+            # La carga compartida usó el token de otro usuario: se intenta con el propio
+            tracks = await self._load(playlist_id, loader, refresher)
+        return tracks, False, 0.0
+
+    async def _load(self, playlist_id: str, loader: PlaylistLoader, refresher: Optional[PlaylistLoader]) -> List[Dict]:
+        tracks, complete = await loader(playlist_id)
+        if complete and tracks:
+            entry = CachedPlaylist(tracks=tracks, fetched_at=time.time())
+            await self._store(playlist_id, entry)
+            self._schedule_refresh(playlist_id, refresher, entry)
+        return tracks
+
+    def _forget_load(self, playlist_id: str, task: asyncio.Task) -> None:
+        if self._loads.get(playlist_id) is task:
+            del self._loads[playlist_id]
+        # Marcar la excepción como leída aunque todos los llamadores se hayan cancelado
+        if not task.cancelled():
+            task.exception()
+
+    def _schedule_refresh(self, playlist_id: str, refresher: Optional[PlaylistLoader], entry: CachedPlaylist) -> None:
+        if refresher is None:
+            return
+        task = self._refresh_tasks.get(playlist_id)
+        if task is not None and not task.done():
+            return
+        delay = max(0.0, self.ttl - self.refresh_margin - entry.age)
+        self._refresh_tasks[playlist_id] = asyncio.create_task(
+            self._refresh_loop(playlist_id, refresher, delay)
+        )
+
+    async def _refresh_loop(self, playlist_id: str, refresher: PlaylistLoader, delay: float) -> None:
+        try:
+            while True:
+                await asyncio.sleep(delay)
+
+                # Otro proceso pudo haber refrescado ya la entrada en Redis
+                entry = await self._read(playlist_id)
+                if entry is not None and entry.age < self.ttl - self.refresh_margin:
+                    delay = self.ttl - self.refresh_margin - entry.age
+                    continue
+
+                try:
+                    tracks, complete = await refresher(playlist_id)
+                except Exception as e:
+                    logger.warning(f"Error refrescando playlist {playlist_id}: {e}")
+                    return
+                if not (complete and tracks):
+                    return
+
+                await self._store(playlist_id, CachedPlaylist(tracks=tracks, fetched_at=time.time()))
+                delay = self.ttl - self.refresh_margin
+        finally:
+            self._refresh_tasks.pop(playlist_id, None)
+
+    async def aclose(self) -> None:
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        self._refresh_tasks.clear()
+        for task in list(self._loads.values()):
+            task.cancel()
+        self._loads.clear()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Instancia global de la caché
+playlist_cache = PlaylistTrackCache(
+    ttl=settings.SPOTIFY_PLAYLIST_CACHE_TTL,
+    refresh_margin=settings.SPOTIFY_PLAYLIST_CACHE_REFRESH_MARGIN,
+    redis_url=settings.SPOTIFY_CACHE_REDIS_URL,
+)
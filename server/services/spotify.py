@@ -1,8 +1,20 @@
+import asyncio
 import os
 import requests
 import secrets
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from server.core.config import settings
+from server.services.spotify_client import spotify_client
+from server.services.playlist_cache import playlist_cache
+from server.services.track_selection import (
+    EMOTION_TO_GENRES,
+    is_playable,
+    normalize_track,
+    pages_for_offsets,
+    reservoir_sample,
+    sample_offsets,
+)
 import random
 import base64
 
@@ -18,6 +30,12 @@ SPOTIFY_AUTH_URL = "https://accounts.spotify.com/authorize"
 SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 SPOTIFY_API_BASE_URL = "https://api.spotify.com/v1"
 
+# Máximo de items por página que acepta /playlists/{id}/tracks
+PLAYLIST_PAGE_SIZE = 50
+
+# Canciones devueltas por recomendación
+RECOMMENDATION_COUNT = 30
+
 
 
 def get_spotify_auth_url(state: str):
@@ -74,12 +92,220 @@ def get_spotify_token(code: str) -> Dict:
     return token_data
 
 
-def get_recommendations(access_token: str, emotion: str) -> Dict:
+class SpotifyTokenExpired(Exception):
+    """El token usado contra la API de Spotify ha caducado (401)"""
+
+
+class SpotifyRateLimited(Exception):
+    """Spotify sigue respondiendo 429 después de los reintentos"""
+
+    def __init__(self, retry_after: Optional[str] = None):
+        super().__init__("Spotify rate limit")
+        self.retry_after = retry_after
+
+
+def _rate_limited_response(emotion: str, retry_after: Optional[str] = None) -> Dict:
+    # No se usa el respaldo: duplicaría el tráfico justo cuando Spotify pide menos
+    return {
+        "error": "rate_limited",
+        "message": "Spotify está limitando las solicitudes, intenta de nuevo en unos segundos",
+        "status_code": 429,
+        "retry_after": retry_after,
+        "tracks": [],
+        "emotion": emotion
+    }
+
+
+# Token de aplicación (client credentials) compartido por todo el proceso
+_app_token: Dict = {"access_token": None, "expires_at": 0.0, "pending": None}
+
+
+async def get_app_access_token() -> Optional[str]:
     """
-    Obtiene canciones de playlists específicas según la emoción
+    Obtiene (y reutiliza hasta que caduque) un token de aplicación mediante
+    el flujo client credentials. Devuelve None si no se pudo obtener.
+    """
+    if _app_token["access_token"] and time.time() < _app_token["expires_at"]:
+        return _app_token["access_token"]
+
+    if not (CLIENT_ID and CLIENT_SECRET):
+        return None
+
+    # Requests concurrentes comparten la misma renovación
+    pending = _app_token["pending"]
+    if pending is None or pending.done() or pending.get_loop() is not asyncio.get_running_loop():
+        pending = asyncio.ensure_future(_request_app_access_token())
+        _app_token["pending"] = pending
+    return await asyncio.shield(pending)
+
+
+async def _request_app_access_token() -> Optional[str]:
+    basic_token = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
+    try:
+        response = await spotify_client.post_form(
+            SPOTIFY_TOKEN_URL,
+            data={"grant_type": "client_credentials"},
+            headers={"Authorization": f"Basic {basic_token}"},
+        )
+    except Exception as e:
+        print(f"⚠️ Error obteniendo token de aplicación: {e}")
+        return None
+
+    if response.status_code != 200:
+        print(f"⚠️ Error obteniendo token de aplicación: {response.status_code}")
+        return None
+
+    token_data = response.json()
+    _app_token["access_token"] = token_data.get("access_token")
+    # Renovar un minuto antes de que caduque
+    _app_token["expires_at"] = time.time() + token_data.get("expires_in", 3600) - 60
+    return _app_token["access_token"]
+
+
+def _invalidate_app_token() -> None:
+    _app_token["access_token"] = None
+    _app_token["expires_at"] = 0.0
+
+
+async def _crawl_playlist(playlist_id: str, access_token: str) -> Tuple[List[Dict], bool]:
     """
-    headers = {"Authorization": f"Bearer {access_token}"}
+    Recorre una playlist completa y devuelve (canciones normalizadas, completo).
 
+    Lanza SpotifyTokenExpired si Spotify responde 401.
+    """
+    all_tracks = []
+    url = f"{SPOTIFY_API_BASE_URL}/playlists/{playlist_id}/tracks"
+
+    # Primera request para obtener información básica (incluye "total")
+    response = await spotify_client.get(url, access_token, params={"limit": PLAYLIST_PAGE_SIZE, "offset": 0})
+    responses = [response]
+
+    if response.status_code == 200:
+        total = response.json().get("total") or 0
+        # Pedir el resto de páginas en paralelo, con un máximo de requests simultáneas
+        semaphore = asyncio.Semaphore(settings.SPOTIFY_PAGE_CONCURRENCY)
+
+        async def fetch_page(offset: int):
+            async with semaphore:
+                return await spotify_client.get(url, access_token, params={"limit": PLAYLIST_PAGE_SIZE, "offset": offset})
+
+        responses += await asyncio.gather(
+            *(fetch_page(offset) for offset in range(PLAYLIST_PAGE_SIZE, total, PLAYLIST_PAGE_SIZE))
+        )
+
+    # Reensamblar en orden de offset
+    for response in responses:
+        if response.status_code == 401:
+            raise SpotifyTokenExpired()
+
+        if response.status_code == 429:
+            raise SpotifyRateLimited(response.headers.get("Retry-After"))
+
+        if response.status_code != 200:
+            print(f"Error obteniendo playlist: {response.status_code}")
+            return all_tracks, False
+
+        tracks_data = response.json().get("items", [])
+        
+        if not tracks_data:
+            break
+        
+        for track_item in tracks_data:
+            track = track_item.get("track")
+            if is_playable(track):  # Verificar que sea una canción válida
+                all_tracks.append(normalize_track(track, playlist_source=True))
+
+    return all_tracks, True
+
+
+async def _sample_playlist(playlist_id: str, access_token: str, k: int) -> Tuple[List[Dict], int]:
+    """
+    Elige k canciones al azar sin recorrer toda la playlist: muestrea
+    posiciones sobre "total" y solo pide las páginas que las contienen.
+
+    Devuelve (canciones seleccionadas, total de items en la playlist).
+    Lanza SpotifyTokenExpired si Spotify responde 401.
+    """
+    url = f"{SPOTIFY_API_BASE_URL}/playlists/{playlist_id}/tracks"
+
+    response = await spotify_client.get(url, access_token, params={"limit": PLAYLIST_PAGE_SIZE, "offset": 0})
+    if response.status_code == 401:
+        raise SpotifyTokenExpired()
+    if response.status_code == 429:
+        raise SpotifyRateLimited(response.headers.get("Retry-After"))
+    if response.status_code != 200:
+        print(f"Error obteniendo playlist: {response.status_code}")
+        return [], 0
+
+    data = response.json()
+    pages = {0: data.get("items", [])}
+    total = data.get("total") or len(pages[0])
+
+    offsets = sample_offsets(total, k)
+    missing_pages = [page for page in pages_for_offsets(offsets, PLAYLIST_PAGE_SIZE) if page not in pages]
+    semaphore = asyncio.Semaphore(settings.SPOTIFY_PAGE_CONCURRENCY)
+
+    async def fetch_page(offset: int):
+        async with semaphore:
+            return await spotify_client.get(url, access_token, params={"limit": PLAYLIST_PAGE_SIZE, "offset": offset})
+
+    responses = await asyncio.gather(*(fetch_page(page) for page in missing_pages))
+    for page, response in zip(missing_pages, responses):
+        if response.status_code == 401:
+            raise SpotifyTokenExpired()
+        if response.status_code == 429:
+            raise SpotifyRateLimited(response.headers.get("Retry-After"))
+        if response.status_code != 200:
+            print(f"Error obteniendo página {page} de la playlist: {response.status_code}")
+            continue
+        pages[page] = response.json().get("items", [])
+
+    def track_at(offset: int) -> Optional[Dict]:
+        items = pages.get(offset - offset % PLAYLIST_PAGE_SIZE, [])
+        index = offset % PLAYLIST_PAGE_SIZE
+        return items[index].get("track") if index < len(items) else None
+
+    # Construir el dict solo para las canciones elegidas
+    chosen = set()
+    selected_tracks = []
+    for offset in offsets:
+        track = track_at(offset)
+        if is_playable(track):
+            chosen.add(offset)
+            selected_tracks.append(normalize_track(track, playlist_source=True))
+
+    # Completar con las páginas ya descargadas si algún offset era un hueco
+    shortfall = len(offsets) - len(selected_tracks)
+    if shortfall > 0:
+        spare = (
+            item.get("track")
+            for page, items in pages.items()
+            for index, item in enumerate(items)
+            if page + index not in chosen and is_playable(item.get("track"))
+        )
+        selected_tracks += [normalize_track(track, playlist_source=True) for track in reservoir_sample(spare, shortfall)]
+
+    return selected_tracks, total
+
+
+async def _crawl_playlist_with_app_token(playlist_id: str) -> Tuple[List[Dict], bool]:
+    """
+    Refresco en segundo plano de la caché: solo usa el token de aplicación
+    """
+    app_token = await get_app_access_token()
+    if not app_token:
+        raise Exception("Token de aplicación de Spotify no disponible")
+    try:
+        return await _crawl_playlist(playlist_id, app_token)
+    except SpotifyTokenExpired:
+        _invalidate_app_token()
+        raise
+
+
+async def get_recommendations(access_token: str, emotion: str) -> Dict:
+    """
+    Obtiene canciones de playlists específicas según la emoción
+    """
     # Mapeo de emociones a playlists específicas
     emotion_to_playlists = {
         "happy": "3fq31QHkcmRPG1uCPYBddE",
@@ -92,86 +318,54 @@ def get_recommendations(access_token: str, emotion: str) -> Dict:
     playlist_id = emotion_to_playlists.get(emotion.lower())
     
     if not playlist_id:
-        return get_fallback_recommendations(access_token, emotion)
-    
-    all_tracks = []
-    
-    # Obtener todas las canciones de la playlist
-    url = f"{SPOTIFY_API_BASE_URL}/playlists/{playlist_id}/tracks"
+        return await get_fallback_recommendations(access_token, emotion)
+
+    async def load_playlist(playlist_id: str) -> Tuple[List[Dict], bool]:
+        # Preferir el token de aplicación para que la caché no dependa del usuario
+        app_token = await get_app_access_token()
+        if app_token:
+            try:
+                return await _crawl_playlist(playlist_id, app_token)
+            except SpotifyTokenExpired:
+                _invalidate_app_token()
+        return await _crawl_playlist(playlist_id, access_token)
     
     try:
         print(f"Buscando canciones de la playlist para: {emotion}")
-        
-        # Primera request para obtener información básica
-        params = {
-            "limit": 50,
-            "offset": 0
+
+        if settings.SPOTIFY_PLAYLIST_CACHE_ENABLED:
+            all_tracks, cache_hit, cache_age = await playlist_cache.get(
+                playlist_id, load_playlist, refresher=_crawl_playlist_with_app_token
+            )
+            # Seleccionar canciones aleatorias (sin mutar la lista cacheada)
+            selected_tracks = random.sample(all_tracks, min(RECOMMENDATION_COUNT, len(all_tracks)))
+            available = len(all_tracks)
+        else:
+            # Sin caché: pedir solo las páginas de las posiciones muestreadas
+            selected_tracks, available = await _sample_playlist(playlist_id, access_token, RECOMMENDATION_COUNT)
+            cache_hit, cache_age = False, 0.0
+
+    except SpotifyTokenExpired:
+        return {
+            "error": "token_expired",
+            "message": "El token de acceso ha caducado",
+            "status_code": 401,
+            "tracks": [],
+            "emotion": emotion
         }
-        
-        while True:
-            response = requests.get(url, headers=headers, params=params)
-            
-
-            if response.status_code == 401:
-                return {
-                    "error": "token_expired",
-                    "message": "El token de acceso ha caducado",
-                    "status_code": 401,
-                    "tracks": [],
-                    "emotion": emotion
-                }
-
-
-            if response.status_code == 200:
-                data = response.json()
-                tracks_data = data.get("items", [])
-                
-                if not tracks_data:
-                    break
-                
-                for track_item in tracks_data:
-                    track = track_item.get("track")
-                    if track and track.get("id"):  # Verificar que sea una canción válida
-                        artists = [{"name": artist.get("name")} for artist in track.get("artists", [])[:2]]
-                        
-                        all_tracks.append({
-                            "name": track.get("name"),
-                            "artists": artists,
-                            "album": {
-                                "name": track.get("album", {}).get("name"),
-                                "images": track.get("album", {}).get("images", [])
-                            },
-                            "external_urls": track.get("external_urls", {}),
-                            "preview_url": track.get("preview_url"),
-                            "uri": track.get("uri"),
-                            "duration_ms": track.get("duration_ms"),
-                            "popularity": track.get("popularity", 0),
-                            "playlist_source": True
-                        })
-                
-                # Verificar si hay más páginas
-                if data.get("next"):
-                    params["offset"] += params["limit"]
-                else:
-                    break
-            else:
-                print(f"Error obteniendo playlist: {response.status_code}")
-                break
-                
+    except SpotifyRateLimited as e:
+        print(f"⚠️ Spotify limitó las solicitudes de la playlist (Retry-After: {e.retry_after})")
+        return _rate_limited_response(emotion, e.retry_after)
     except Exception as e:
         print(f"⚠️ Error buscando playlist: {e}")
-        return get_fallback_recommendations(access_token, emotion)
+        return await get_fallback_recommendations(access_token, emotion)
     
     # Si no se encontraron tracks, usar búsqueda genérica
-    if not all_tracks:
+    if not selected_tracks:
         print("Playlist vacía o no encontrada, usando búsqueda genérica...")
-        return get_fallback_recommendations(access_token, emotion)
-    
-    # Seleccionar 30 canciones aleatorias
-    random.shuffle(all_tracks)
-    selected_tracks = all_tracks[:30]
+        return await get_fallback_recommendations(access_token, emotion)
     
-    print(f"Encontradas {len(all_tracks)} canciones en la playlist, seleccionadas 30 aleatorias")
+    print(f"Encontradas {available} canciones en la playlist, seleccionadas {len(selected_tracks)} aleatorias")
     
     return {
         "tracks": selected_tracks,
@@ -180,99 +374,105 @@ def get_recommendations(access_token: str, emotion: str) -> Dict:
         "playlist_used": playlist_id,
         "search_method": "playlist_based",
         "note": f"30 canciones aleatorias de la playlist de {emotion}",
-        "available_in_playlist": len(all_tracks)
+        "available_in_playlist": available,
+        "cache_hit": cache_hit,
+        "cache_age_seconds": round(cache_age, 1)
     }
 
 
-def get_fallback_recommendations(access_token: str, emotion: str) -> Dict:
+async def get_fallback_recommendations(access_token: str, emotion: str) -> Dict:
     """
     Función de respaldo si la playlist no está disponible
     """
-    headers = {"Authorization": f"Bearer {access_token}"}
     
     # Géneros como respaldo
-    emotion_to_genres = {
-        "happy": ["dance", "disco", "funk", "reggaeton"],
-        "sad": ["acoustic", "folk", "singer-songwriter", "indie", "piano"],
-        "angry": ["metal", "hard-rock", "punk", "grunge", "nu-metal"],
-        "relaxed": ["chill", "ambient", "classical", "jazz", "lofi"],
-        "energetic": ["electronic", "dance", "house", "techno", "edm"]
-    }
-    
-    genres = emotion_to_genres.get(emotion.lower(), ["pop"])
+    genres = EMOTION_TO_GENRES.get(emotion.lower(), ["pop"])
     
-    all_tracks = []
+    # Candidatos como (canción de Spotify, género): el dict final solo se
+    # construye para los que resulten elegidos
+    candidates = []
     seen_track_names = set()
     
-    # Buscar en cada género
-    for genre in genres:
-        if len(all_tracks) >= 30:
-            break
-            
-        search_query = f"genre:{genre}"
+    url = f"{SPOTIFY_API_BASE_URL}/search"
+
+    async def search_genre(genre: str):
         params = {
-            "q": search_query,
+            "q": f"genre:{genre}",
             "type": "track",
             "limit": 20,
         }
+        return genre, await spotify_client.get(url, access_token, params=params)
 
-        url = f"{SPOTIFY_API_BASE_URL}/search"
-        
-        try:
-            response = requests.get(url, headers=headers, params=params)
-
-
-            if response.status_code == 401:
-                return {
-                    "error": "token_expired",
-                    "message": "El token de acceso ha caducado",
-                    "status_code": 401,
-                    "tracks": [],
-                    "emotion": emotion
-                }
-            
-            if response.status_code == 200:
-                data = response.json()
-                tracks = data.get("tracks", {}).get("items", [])
+    # Lanzar todas las búsquedas a la vez con un plazo compartido; se mezclan
+    # en el orden en que llegan y el resto se cancela al completar 30
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SPOTIFY_FALLBACK_DEADLINE
+    pending = {asyncio.create_task(search_genre(genre)) for genre in genres}
+    token_expired = False
+    rate_limited = None
+
+    try:
+        while pending and len(candidates) < RECOMMENDATION_COUNT and not token_expired and rate_limited is None:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"⚠️ Plazo de búsqueda de respaldo agotado, {len(pending)} géneros sin respuesta")
+                break
+
+            for task in done:
+                try:
+                    genre, response = task.result()
+                except Exception as e:
+                    print(f"⚠️ Error en búsqueda de respaldo: {e}")
+                    continue
+
+                if response.status_code == 401:
+                    token_expired = True
+                    break
+
+                if response.status_code == 429:
+                    rate_limited = response.headers.get("Retry-After") or ""
+                    break
+
+                if response.status_code != 200:
+                    continue
+
+                tracks = response.json().get("tracks", {}).get("items", [])
                 
                 # Ordenar por popularidad y tomar las mejores
                 sorted_tracks = sorted(tracks, key=lambda x: x.get('popularity', 0), reverse=True)
                 
                 for track in sorted_tracks:
-                    if len(all_tracks) >= 30:
+                    if len(candidates) >= RECOMMENDATION_COUNT:
                         break
                         
                     track_name = track.get("name", "").lower().strip()
                     
                     if track_name and track_name not in seen_track_names:
                         seen_track_names.add(track_name)
-                        
-                        artists = [{"name": artist.get("name")} for artist in track.get("artists", [])[:2]]
-                        
-                        all_tracks.append({
-                            "name": track.get("name"),
-                            "artists": artists,
-                            "album": {
-                                "name": track.get("album", {}).get("name"),
-                                "images": track.get("album", {}).get("images", [])
-                            },
-                            "external_urls": track.get("external_urls", {}),
-                            "preview_url": track.get("preview_url"),
-                            "uri": track.get("uri"),
-                            "duration_ms": track.get("duration_ms"),
-                            "popularity": track.get("popularity", 0),
-                            "genre": genre
-                        })
-                            
-        except Exception as e:
-            print(f"⚠️ Error en búsqueda de respaldo: {e}")
-            continue
+                        candidates.append((track, genre))
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if token_expired:
+        return {
+            "error": "token_expired",
+            "message": "El token de acceso ha caducado",
+            "status_code": 401,
+            "tracks": [],
+            "emotion": emotion
+        }
+
+    if rate_limited is not None and not candidates:
+        return _rate_limited_response(emotion, rate_limited or None)
     
-    # Si encontramos tracks en el respaldo, mezclarlos
-    if all_tracks:
-        import random
-        random.shuffle(all_tracks)
-        selected_tracks = all_tracks[:30]
+    # Si encontramos tracks en el respaldo, elegir al azar
+    if candidates:
+        picked = random.sample(candidates, min(RECOMMENDATION_COUNT, len(candidates)))
+        selected_tracks = [normalize_track(track, genre=genre) for track, genre in picked]
         
         return {
             "tracks": selected_tracks,
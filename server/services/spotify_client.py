@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from server.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errores de Spotify que vale la pena reintentar
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket para limitar las requests por segundo de toda la aplicación.
+
+    Además respeta una pausa global cuando Spotify responde 429 con
+    Retry-After, ya que el límite de Spotify es por aplicación.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def block_for(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self) -> float:
+        return max(self._blocked_until - time.monotonic(), 0.0)
+
+    async def acquire(self) -> bool:
+        """
+        Espera hasta disponer de un token. Devuelve True si tuvo que esperar.
+        """
+        waited = False
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                waited = True
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+
+            if self.rate <= 0:
+                return waited
+
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return waited
+
+            waited = True
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SpotifyClient:
+    """
+    Cliente HTTP asíncrono compartido para la API de Spotify.
+
+    Reutiliza un pool de conexiones keep-alive (HTTP/2 si el paquete h2 está
+    instalado) para no pagar un handshake TCP+TLS por cada página.
+
+    Todas las requests GET pasan por un planificador central:
+    - token bucket por aplicación (SPOTIFY_RATE_LIMIT_PER_SECOND / _BURST)
+    - reintentos en 429/5xx respetando Retry-After
+    - single-flight: requests concurrentes idénticas comparten una sola
+      llamada a Spotify
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bucket = TokenBucket(
+            rate=settings.SPOTIFY_RATE_LIMIT_PER_SECOND,
+            capacity=settings.SPOTIFY_RATE_LIMIT_BURST,
+        )
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._stats = {
+            "requests": 0,
+            "upstream_calls": 0,
+            "throttled": 0,
+            "retried": 0,
+            "coalesced": 0,
+            "rate_limit_waits": 0,
+        }
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = settings.SPOTIFY_HTTP2 and _http2_available()
+        if settings.SPOTIFY_HTTP2 and not http2:
+            logger.info("Paquete h2 no instalado, el cliente de Spotify usará HTTP/1.1")
+
+        # El cliente solo habla con api.spotify.com, así que los límites del
+        # pool equivalen a un límite de conexiones por host.
+        limits = httpx.Limits(
+            max_connections=settings.SPOTIFY_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SPOTIFY_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SPOTIFY_HTTP_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            settings.SPOTIFY_HTTP_TIMEOUT,
+            connect=settings.SPOTIFY_HTTP_CONNECT_TIMEOUT,
+        )
+        return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Las conexiones del pool pertenecen al event loop que las creó
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = self._build_client()
+            self._loop = loop
+            self._inflight.clear()
+        return self._client
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, inflight=len(self._inflight))
+
+    async def get(self, url: str, access_token: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """
+        GET autenticado contra la API de Spotify
+        """
+        self._stats["requests"] += 1
+        client = self.client
+
+        key = (url, tuple(sorted((params or {}).items())), access_token)
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._send(client, url, access_token, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+
+        # shield: si un llamador se cancela, los demás siguen esperando la misma llamada
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Tuple, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcar la excepción como leída aunque todos los llamadores se hayan cancelado
+        if not task.cancelled():
+            task.exception()
+
+    async def _send(self, client: httpx.AsyncClient, url: str, access_token: str, params: Optional[Dict[str, Any]]) -> httpx.Response:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        attempt = 0
+        while True:
+            # Durante una pausa larga pedida por Spotify se responde 429 sin salir a la red
+            blocked_for = self._bucket.blocked_for()
+            if blocked_for > settings.SPOTIFY_MAX_RETRY_AFTER:
+                self._stats["throttled"] += 1
+                return httpx.Response(
+                    429,
+                    headers={"Retry-After": str(int(blocked_for) + 1)},
+                    request=httpx.Request("GET", url, params=params),
+                )
+
+            if await self._bucket.acquire():
+                self._stats["rate_limit_waits"] += 1
+
+            self._stats["upstream_calls"] += 1
+            response = await client.get(url, headers=headers, params=params)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+
+            if response.status_code == 429:
+                self._stats["throttled"] += 1
+                delay = _retry_after_seconds(response)
+                if delay is None:
+                    delay = settings.SPOTIFY_RETRY_BACKOFF * (2 ** attempt)
+                # No retener la request si Spotify pide esperar demasiado
+                if delay > settings.SPOTIFY_MAX_RETRY_AFTER:
+                    logger.warning(f"Spotify pidió esperar {delay}s, se devuelve el 429 sin reintentar")
+                    self._bucket.block_for(delay)
+                    return response
+                self._bucket.block_for(delay)
+            else:
+                delay = settings.SPOTIFY_RETRY_BACKOFF * (2 ** attempt)
+
+            if attempt >= settings.SPOTIFY_MAX_RETRIES:
+                return response
+
+            attempt += 1
+            self._stats["retried"] += 1
+            logger.info(f"Spotify respondió {response.status_code}, reintento {attempt} en {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def post_form(self, url: str, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        POST form-urlencoded (p. ej. contra accounts.spotify.com/api/token)
+        """
+        return await self.client.post(url, data=data, headers=headers)
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+        self._inflight.clear()
+
+
+# Instancia global del cliente
+spotify_client = SpotifyClient()
@@ -0,0 +1,74 @@
+import random
+from typing import Dict, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Géneros asociados a cada emoción (búsqueda de respaldo y catálogo mockup)
+EMOTION_TO_GENRES = {
+    "happy": ["dance", "disco", "funk", "reggaeton"],
+    "sad": ["acoustic", "folk", "singer-songwriter", "indie", "piano"],
+    "angry": ["metal", "hard-rock", "punk", "grunge", "nu-metal"],
+    "relaxed": ["chill", "ambient", "classical", "jazz", "lofi"],
+    "energetic": ["electronic", "dance", "house", "techno", "edm"]
+}
+
+
+def normalize_track(track: Dict, **extra) -> Dict:
+    """
+    Construye el dict de canción que devuelve la API a partir del objeto de Spotify
+    """
+    artists = [{"name": artist.get("name")} for artist in track.get("artists", [])[:2]]
+
+    return {
+        "name": track.get("name"),
+        "artists": artists,
+        "album": {
+            "name": track.get("album", {}).get("name"),
+            "images": track.get("album", {}).get("images", [])
+        },
+        "external_urls": track.get("external_urls", {}),
+        "preview_url": track.get("preview_url"),
+        "uri": track.get("uri"),
+        "duration_ms": track.get("duration_ms"),
+        "popularity": track.get("popularity", 0),
+        **extra
+    }
+
+
+def is_playable(track: Optional[Dict]) -> bool:
+    """
+    Los items de playlist pueden ser canciones locales o eliminadas (sin id)
+    """
+    return bool(track and track.get("id"))
+
+
+def sample_offsets(total: int, k: int, rng: random.Random = random) -> List[int]:
+    """
+    Elige k posiciones distintas de [0, total) sin materializar la lista
+    """
+    return rng.sample(range(total), min(k, max(total, 0)))
+
+
+def pages_for_offsets(offsets: Iterable[int], page_size: int) -> List[int]:
+    """
+    Offsets de página (múltiplos de page_size) que contienen las posiciones dadas
+    """
+    return sorted({offset - offset % page_size for offset in offsets})
+
+
+def reservoir_sample(items: Iterable[T], k: int, rng: random.Random = random) -> List[T]:
+    """
+    Muestreo uniforme de k elementos de un iterable de longitud desconocida
+    (algoritmo R), en una sola pasada y con memoria O(k)
+    """
+    reservoir: List[T] = []
+    if k <= 0:
+        return reservoir
+    for i, item in enumerate(items):
+        if i < k:
+            reservoir.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = item
+    return reservoir
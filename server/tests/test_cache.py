@@ -0,0 +1,116 @@
+import asyncio
+import io
+
+from PIL import Image, ImageDraw
+
+from server.services.emotion_cache import EmotionResultCache, cache_scope, dhash_bands
+from server.services.playlist_cache import PlaylistTrackCache
+from server.utils.cache import LRUTTLCache
+
+
+def _image(shift=0, quality=90, size=(320, 240)):
+    img = Image.new("RGB", size, (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((80 + shift, 40, 240 + shift, 200), fill=(220, 180, 150))
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUTTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_respects_byte_cap_and_ttl():
+    cache = LRUTTLCache(ttl=60, max_entries=10, max_bytes=10, sizeof=len)
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)
+    assert len(cache) == 1 and cache.get("b") == "y" * 6
+
+    expired = LRUTTLCache(ttl=0, max_entries=10)
+    expired.set("a", 1)
+    assert expired.get("a") is None
+    assert expired.stats()["expirations"] == 1
+
+def test_emotion_cache_exact_and_perceptual_hits():
+    cache = EmotionResultCache(ttl=60, max_entries=10, max_bytes=1 << 20, hamming_threshold=6)
+    result = {"emotion": "happy", "confidence": 0.8, "emotions_detected": {"happy": 0.8}}
+
+    async def run():
+        cached, key = await cache.lookup(_image())
+        assert cached is None
+        cache.store(key, result)
+
+        assert (await cache.lookup(_image()))[0] == result
+        # Mismo frame re-encodado con otra calidad
+        assert (await cache.lookup(_image(quality=60)))[0] == result
+        # Imagen claramente distinta
+        assert (await cache.lookup(_image(shift=-80)))[0] is None
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["perceptual_hits"], stats["misses"]) == (1, 1, 2)
+
+
+
+def test_dhash_bands_cover_all_bits():
+    for threshold in (1, 6, 63, 100):
+        bands = dhash_bands(threshold)
+        assert sum(mask.bit_length() for _, mask in bands) == 64
+        assert len(bands) == min(threshold + 1, 64)
+
+
+def test_emotion_cache_is_scoped_per_user_and_unindexes_evictions():
+    cache = EmotionResultCache(ttl=60, max_entries=1, max_bytes=1 << 20, hamming_threshold=6)
+    result = {"emotion": "sad", "confidence": 0.7, "emotions_detected": {"sad": 0.7}}
+
+    async def run():
+        cache_scope.set("ana@example.com")
+        _, key = await cache.lookup(_image())
+        cache.store(key, result)
+        own_hit = (await cache.lookup(_image(quality=60)))[0]
+
+        cache_scope.set("luis@example.com")
+        other_user = (await cache.lookup(_image()))[0]
+        # max_entries=1: la entrada de Ana se desaloja y sale del índice
+        _, key = await cache.lookup(_image(shift=-80))
+        cache.store(key, result)
+        return own_hit, other_user
+
+    own_hit, other_user = asyncio.run(run())
+    assert own_hit == result and other_user is None
+    assert {scope for scope, _, _ in cache._index} == {"luis@example.com"}
+
+
+def test_playlist_cache_loads_once_for_concurrent_misses():
+    calls = []
+
+    async def loader(playlist_id):
+        calls.append(playlist_id)
+        await asyncio.sleep(0.01)
+        return [{"name": "a"}], True
+
+    async def failing_loader(playlist_id):
+        calls.append("expired")
+        raise RuntimeError("token expirado")
+
+    async def run():
+        cache = PlaylistTrackCache(ttl=60, refresh_margin=10)
+        results = await asyncio.gather(*(cache.get("p1", loader) for _ in range(5)))
+        # Si la carga compartida falla, los que esperaban usan su propio loader
+        other = await asyncio.gather(
+            cache.get("p2", failing_loader), cache.get("p2", loader), return_exceptions=True
+        )
+        await cache.aclose()
+        return results, other
+
+    results, other = asyncio.run(run())
+    assert all(tracks == [{"name": "a"}] for tracks, _, _ in results)
+    assert isinstance(other[0], RuntimeError) and other[1][0] == [{"name": "a"}]
+    assert calls == ["p1", "expired", "p2"]
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from server.core import dependencies
+from server.core.security import create_access_token
+
+
+def test_get_current_user_caches_by_token(monkeypatch):
+    lookups = []
+
+    async def find_user(db, email):
+        lookups.append(email)
+        return SimpleNamespace(id=7, nombre="Ana", email=email)
+
+    monkeypatch.setattr(dependencies, "_find_user_by_email", find_user)
+    dependencies._user_cache.clear()
+    header = "Bearer " + create_access_token({"sub": "ana@example.com"})
+
+    first = asyncio.run(dependencies.get_current_user(header, db=None))
+    second = asyncio.run(dependencies.get_current_user(header, db=None))
+    assert first == second and first.email == "ana@example.com"
+    assert lookups == ["ana@example.com"]
+
+    dependencies.invalidate_cached_user(7)
+    asyncio.run(dependencies.get_current_user(header, db=None))
+    assert len(lookups) == 2
+
+def test_get_current_user_rejects_bad_header():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(dependencies.get_current_user("Token abc", db=None))
+    assert exc.value.status_code == 401
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(dependencies.get_current_user("Bearer abc", db=None))
+    assert exc.value.status_code == 401
+
+
+def test_get_optional_user_degrades_when_db_fails(monkeypatch):
+    async def no_db():
+        yield None
+
+    async def find_user(db, email):
+        raise OperationalError("SELECT", {}, Exception("conexión perdida"))
+
+    monkeypatch.setattr(dependencies, "get_async_db", no_db)
+    monkeypatch.setattr(dependencies, "_find_user_by_email", find_user)
+    dependencies._user_cache.clear()
+    header = "Bearer " + create_access_token({"sub": "ana@example.com"})
+
+    assert asyncio.run(dependencies.get_optional_user(header)) is None
+    assert asyncio.run(dependencies.get_optional_user("Bearer abc")) is None
+    assert dependencies.is_app_token(header) and not dependencies.is_app_token("Bearer abc")
@@ -0,0 +1,19 @@
+import pytest
+
+from server.services.email_templates import TEMPLATES, CompiledTemplate
+
+
+def test_compiled_template_renders_and_escapes():
+    template = CompiledTemplate("<p>$name cuesta $$5 (${name})</p>", escape=True)
+    assert template.fields == {"name"}
+    assert template.render(name="<b>Ana</b>") == "<p>&lt;b&gt;Ana&lt;/b&gt; cuesta $5 (&lt;b&gt;Ana&lt;/b&gt;)</p>"
+    with pytest.raises(KeyError):
+        template.render()
+
+def test_contact_template_escapes_only_html():
+    subject, text, html = TEMPLATES["contact"].render(
+        name="Ana", email="ana@example.com", subject="Hola", message="<script>x</script>"
+    )
+    assert subject == "Contacto Ánima: Hola"
+    assert "<script>x</script>" in text
+    assert "&lt;script&gt;x&lt;/script&gt;" in html and "<script>" not in html
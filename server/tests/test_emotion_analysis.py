@@ -0,0 +1,55 @@
+import asyncio
+
+from server.services.emotion_analysis import (
+    EmotionSmoother,
+    MockEmotionEngine,
+    aggregate_emotions,
+    best_frame,
+    is_mock_result,
+    map_aws_emotions,
+    mock_result,
+    top_emotion,
+)
+
+
+def test_map_aws_emotions_merges_and_normalizes():
+    emotions = map_aws_emotions({"SAD": 50, "FEAR": 30, "CALM": 20})
+    assert emotions == {"sad": 0.8, "relaxed": 0.2}
+    assert top_emotion(emotions) == ("sad", 0.8)
+    assert top_emotion({}) == (None, 0.0)
+
+def test_aggregate_emotions_weights_by_face_confidence():
+    results = [
+        {"emotions_detected": {"happy": 1.0}, "face_confidence": 0.9},
+        {"emotions_detected": {"sad": 1.0}, "face_confidence": 0.1},
+    ]
+    assert aggregate_emotions(results) == {"happy": 0.9, "sad": 0.1}
+    assert aggregate_emotions([]) == {}
+
+def test_best_frame_prefers_face_confidence_and_skips_failures():
+    frames = [
+        {"face_confidence": 0.9, "confidence": 0.5},
+        None,
+        {"face_confidence": 0.99, "confidence": 0.4},
+        {"face_confidence": 0.99, "confidence": 0.7},
+    ]
+    assert best_frame(frames) == 3
+    assert best_frame([None, None]) is None
+
+def test_emotion_smoother_ema():
+    smoother = EmotionSmoother(alpha=0.5, emotions=("happy", "sad"))
+    assert smoother.update({"happy": 1.0}) == {"happy": 1.0, "sad": 0.0}
+    assert smoother.update({"sad": 1.0}) == {"happy": 0.5, "sad": 0.5}
+    assert smoother.update({"sad": 1.0}) == {"happy": 0.25, "sad": 0.75}
+    smoother.reset()
+    assert smoother.update({"sad": 1.0}) == {"happy": 0.0, "sad": 1.0}
+
+def test_deterministic_mock_engine_is_stable_per_image():
+    engine = MockEmotionEngine(deterministic=True)
+    first = asyncio.run(engine.analyze(b"frame-a"))
+    assert asyncio.run(engine.analyze(b"frame-a"))["emotion"] == first["emotion"]
+    assert first["engine"] == "mock"
+    # También el fallback mockup: no debe llegar al historial
+    assert is_mock_result(first) and is_mock_result(mock_result())
+    assert not is_mock_result({"emotion": "happy", "engine": "rekognition"})
+    assert engine.stats()["calls"] == 2
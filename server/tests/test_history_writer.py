@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from server.db.base import Base
+from server.db.models.history import Cancion, Emocion
+from server.db.models.user import User
+from server.services.history_writer import HistoryWriter
+
+TRACKS = [
+    {"name": "Song A", "artists": [{"name": "Artist 1"}, {"name": "Artist 2"}], "album": {"name": "Album"}},
+    {"name": "Song B" * 30, "artists": [], "album": None},
+    {"artists": [{"name": "Sin título"}]},
+]
+
+
+async def _database():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    # SQLite no comprueba las FK si no se pide (Postgres sí)
+    event.listen(engine.sync_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[User.__table__, Emocion.__table__, Cancion.__table__])
+        await conn.execute(insert(User).values(id=1, nombre="Ana", email="ana@example.com", password="x"))
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def _writer(sessions, batch_size=100):
+    return HistoryWriter(session_factory=sessions, batch_size=batch_size, flush_interval=60, max_pending=10)
+
+
+async def _count(sessions, model):
+    async with sessions() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+def test_history_writer_batches_analyses_and_tracks():
+    async def run():
+        engine, sessions = await _database()
+        writer = _writer(sessions)
+        first = writer.record_analysis(1, "happy", 0.9)
+        second = writer.record_analysis(1, "sad", None)
+        assert writer.record_tracks(first, 1, TRACKS) == 2  # la canción sin nombre no se guarda
+        # Una sola vez por análisis, solo su dueño y solo ids emitidos
+        assert writer.record_tracks(first, 1, TRACKS) == 0
+        assert writer.record_tracks(second, 2, TRACKS) == 0
+        assert writer.record_tracks("00000000-0000-0000-0000-000000000000", 1, TRACKS) == 0
+        assert writer.pending == 4
+        assert writer.has_pending(1) and not writer.has_pending(2)
+        # Sin tocar la BD hasta el flush
+        assert await _count(sessions, Emocion) == 0
+
+        assert await writer.flush() == 4
+        assert not writer.has_pending(1)
+        # Canciones de un análisis que ya se escribió en un lote anterior
+        writer.record_tracks(second, 1, TRACKS[:1])
+        await writer.aclose()
+
+        async with sessions() as db:
+            titles = {
+                (emotion, title)
+                for emotion, title in await db.execute(
+                    select(Emocion.nombre, Cancion.titulo).join(Cancion, Cancion.emocion_id == Emocion.id)
+                )
+            }
+            long_title = await db.scalar(select(Cancion.titulo).where(Cancion.titulo.like("Song BSong B%")))
+        await engine.dispose()
+        return writer.stats(), titles, long_title
+
+    stats, titles, long_title = asyncio.run(run())
+    assert titles == {("happy", "Song A"), ("happy", long_title), ("sad", "Song A")}
+    assert len(long_title) == 100
+    assert (stats["batches"], stats["written"], stats["rejected"], stats["pending"]) == (2, 5, 3, 0)
+
+
+def test_history_writer_drops_when_buffer_full():
+    async def run():
+        engine, sessions = await _database()
+        writer = _writer(sessions)
+        ids = [writer.record_analysis(1, "happy", 0.5) for _ in range(11)]
+        await writer.aclose()
+        count = await _count(sessions, Emocion)
+        await engine.dispose()
+        return ids, count, writer.stats()["dropped"]
+
+    ids, count, dropped = asyncio.run(run())
+    assert ids[-1] is None and all(ids[:10])
+    assert (count, dropped) == (10, 1)
+
+
+class _FlakySessions:
+    """
+    Falla las primeras `failures` aperturas de sesión, como una BD caída
+    """
+
+    def __init__(self, sessions, failures):
+        self.sessions = sessions
+        self.failures = failures
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("INSERT", {}, Exception("conexión perdida"))
+        return self.sessions()
+
+
+def test_history_writer_retries_transient_errors_and_isolates_bad_rows():
+    async def run():
+        engine, sessions = await _database()
+        writer = _writer(_FlakySessions(sessions, failures=1))
+        writer.record_analysis(1, "happy", 0.9)
+        # Usuario inexistente (p. ej. borrado antes del flush): viola la FK
+        writer.record_analysis(99, "sad", 0.4)
+        assert await writer.flush() == 0
+        retried = writer.stats()
+        assert await writer.flush() == 1
+        await writer.aclose()
+        async with sessions() as db:
+            names = list(await db.scalars(select(Emocion.nombre)))
+        await engine.dispose()
+        return retried, writer.stats(), names
+
+    retried, stats, names = asyncio.run(run())
+    assert (retried["retried"], retried["pending"]) == (2, 2)
+    assert names == ["happy"]
+    assert (stats["failed"], stats["dropped"], stats["pending"]) == (1, 0, 0)
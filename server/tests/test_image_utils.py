@@ -0,0 +1,61 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from server.utils.image import (
+    ImageValidationError,
+    decode_base64_image,
+    preprocess_image,
+    sniff_image_format,
+    validate_image_bytes,
+)
+
+
+def _jpeg(width=64, height=48):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 10, 10)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(_jpeg()) == "JPEG"
+    assert sniff_image_format(b"\x89PNG\r\n\x1a\n....") == "PNG"
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "WEBP"
+    assert sniff_image_format(b"GIF89a") is None
+
+def test_decode_base64_image_with_data_prefix():
+    data = _jpeg()
+    encoded = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+    assert decode_base64_image(encoded) == data
+    assert decode_base64_image(base64.encodebytes(data).decode()) == data
+    for garbage in ("no es base64!", "!!!!"):
+        with pytest.raises(ImageValidationError, match="Base64"):
+            decode_base64_image(garbage)
+
+def test_validate_image_bytes_reads_dimensions():
+    validated = validate_image_bytes(_jpeg(64, 48))
+    assert (validated.format, validated.width, validated.height) == ("JPEG", 64, 48)
+
+def test_validate_image_bytes_rejects_oversize_and_corrupt():
+    with pytest.raises(ImageValidationError) as exc:
+        validate_image_bytes(_jpeg(), max_bytes=10)
+    assert exc.value.status_code == 413
+
+    with pytest.raises(ImageValidationError) as exc:
+        validate_image_bytes(_jpeg(64, 48), max_pixels=100)
+    assert exc.value.status_code == 413
+
+    with pytest.raises(ImageValidationError) as exc:
+        validate_image_bytes(b"\xff\xd8\xff" + b"\x00" * 32)
+    assert exc.value.status_code == 400
+
+def test_preprocess_image_limits_edge():
+    result = preprocess_image(_jpeg(2000, 1000), max_edge=500)
+    assert (result.width, result.height) == (500, 250)
+    assert result.bytes_saved > 0
+
+def test_preprocess_image_crops_relative_box():
+    result = preprocess_image(_jpeg(1000, 800), max_edge=1024, crop=(0.25, 0.25, 0.75, 0.5))
+    assert (result.width, result.height) == (500, 200)
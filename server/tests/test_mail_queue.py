@@ -0,0 +1,114 @@
+import asyncio
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from server.services.mail_queue import MailQueue, SMTPConnection
+
+
+class _Inbox:
+    def __init__(self):
+        self.messages = []
+        self.ehlos = 0
+        self.fail_next = 0
+        self.fail_reply = "451 Try again later"
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.ehlos += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_next:
+            self.fail_next -= 1
+            return self.fail_reply
+        self.messages.append(envelope.content)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    inbox = _Inbox()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        yield inbox, port
+    finally:
+        controller.stop()
+
+
+def _queue(port, workers=1):
+    return MailQueue(
+        connection_factory=lambda: SMTPConnection(
+            host="127.0.0.1", port=port, use_ssl=False, starttls=False,
+            username=None, password=None, timeout=5, max_idle=60
+        ),
+        max_size=10,
+        workers=workers,
+        max_retries=2,
+        retry_backoff=0.01,
+    )
+
+
+def _message(i):
+    message = EmailMessage()
+    message["From"] = "anima@example.com"
+    message["To"] = f"user{i}@example.com"
+    message["Subject"] = f"Prueba {i}"
+    message.set_content("hola")
+    return message
+
+
+def test_mail_queue_reuses_connection_and_retries(smtp_server):
+    inbox, port = smtp_server
+    inbox.fail_next = 1
+
+    async def run():
+        queue = _queue(port)
+        assert all(queue.enqueue(_message(i)) for i in range(3))
+        assert await queue.drain(timeout=5)
+        stats = queue.stats()
+        await queue.aclose()
+        return stats
+
+    stats = asyncio.run(run())
+    assert len(inbox.messages) == 3
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (3, 1, 0)
+    # Una sola conexión para los tres mensajes (el 451 no la invalida)
+    assert stats["connections_opened"] == 1 and inbox.ehlos == 1
+
+
+def test_mail_queue_rejects_when_full(smtp_server):
+    _, port = smtp_server
+
+    async def run():
+        queue = _queue(port)
+        queue.max_size = 1  # la cola se crea en el primer enqueue
+        accepted = [queue.enqueue(_message(i)) for i in range(2)]
+        await queue.aclose(timeout=5)
+        return accepted, queue.stats()["rejected"]
+
+    assert asyncio.run(run()) == ([True, False], 1)
+
+
+def test_mail_queue_does_not_retry_permanent_errors(smtp_server):
+    inbox, port = smtp_server
+    inbox.fail_next = 1
+    inbox.fail_reply = "554 Message rejected"
+
+    async def run():
+        queue = _queue(port)
+        queue.enqueue(_message(0))
+        assert await queue.drain(timeout=5)
+        await queue.aclose()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (0, 0, 1)
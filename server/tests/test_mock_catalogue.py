@@ -0,0 +1,65 @@
+import json
+import os
+
+from server.services.mock_catalogue import MockCatalogue
+
+
+def _write(path, count, mtime):
+    path.write_text(json.dumps({"tracks": [{"name": f"t{i}"} for i in range(count)]}), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_sample_does_not_mutate_catalogue(tmp_path):
+    path = tmp_path / "catalogo.json"
+    _write(path, 50, 1_000)
+    catalogue = MockCatalogue(str(path), reload=False, reload_interval=0)
+    before = catalogue.snapshot().tracks
+
+    picked = catalogue.sample("happy", 30)
+    assert len(picked) == 30 and len({t["name"] for t in picked}) == 30
+    assert catalogue.snapshot().tracks == before
+    assert catalogue.sample("desconocida", 30) == []
+
+def test_reload_on_mtime_change_and_fallback(tmp_path):
+    path = tmp_path / "catalogo.json"
+    catalogue = MockCatalogue(str(path), reload=True, reload_interval=0)
+    assert catalogue.snapshot().source == "fallback"
+
+    _write(path, 5, 1_000)
+    assert len(catalogue.snapshot().tracks) == 5
+    _write(path, 8, 2_000)
+    assert len(catalogue.snapshot().tracks) == 8
+
+def test_partition_by_tags_features_and_genres(tmp_path):
+    path = tmp_path / "catalogo.json"
+    tracks = [
+        {"name": "etiqueta", "emotion": "Sad", "valence": 0.9, "energy": 0.9},
+        {"name": "features", "audio_features": {"valence": 0.1, "energy": 0.9}},
+        {"name": "genero", "artists": [{"name": "x", "genres": ["Jazz"]}]},
+        {"name": "sin datos"},
+    ]
+    path.write_text(json.dumps({"tracks": tracks}), encoding="utf-8")
+    snapshot = MockCatalogue(str(path), reload=False, reload_interval=0).snapshot()
+
+    assert snapshot.by_emotion["sad"] == (0,)
+    assert snapshot.by_emotion["angry"] == (1,) and snapshot.by_emotion["energetic"] == (1,)
+    assert snapshot.by_emotion["relaxed"] == (2,)
+    # Sin canciones propias: catálogo completo
+    assert snapshot.unpartitioned == {"happy"}
+    assert snapshot.by_emotion["happy"] == (0, 1, 2, 3)
+
+
+def test_artist_genres_and_malformed_features(tmp_path):
+    path = tmp_path / "catalogo.json"
+    tracks = [
+        {"name": "rock", "audio_features": "n/a", "artists": [{"genres": ["modern hard rock"]}]},
+        {"name": "pop", "audio_features": [0.1, 0.2], "artists": [{"genres": ["indie pop"]}]},
+        {"name": "metal", "genres": ["Nu Metal", "metalcore"]},
+        "no es un dict",
+    ]
+    path.write_text(json.dumps({"tracks": tracks}), encoding="utf-8")
+    snapshot = MockCatalogue(str(path), reload=False, reload_interval=0).snapshot()
+
+    assert snapshot.source == str(path) and len(snapshot.tracks) == 3
+    assert snapshot.by_emotion["angry"] == (0, 2)
+    assert snapshot.by_emotion["sad"] == (1,)
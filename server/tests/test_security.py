@@ -0,0 +1,28 @@
+import asyncio
+
+from server.core import security
+from server.core.config import settings
+
+
+def test_needs_rehash_compares_cost(monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 6)
+    assert security.needs_rehash(security.hash_password("secreto", rounds=4))
+    assert not security.needs_rehash(security.hash_password("secreto", rounds=6))
+    assert not security.needs_rehash("no-es-bcrypt")
+
+def test_async_hash_roundtrip(monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_USE_PROCESSES", False)
+    security.shutdown_hashing_pool()
+
+    async def roundtrip():
+        hashed = await security.hash_password_async("secreto")
+        return (
+            await security.verify_password_async("secreto", hashed),
+            await security.verify_password_async("otra", hashed),
+        )
+
+    try:
+        assert asyncio.run(roundtrip()) == (True, False)
+    finally:
+        security.shutdown_hashing_pool()
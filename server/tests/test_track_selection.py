@@ -0,0 +1,50 @@
+import random
+
+from server.services.track_selection import (
+    is_playable,
+    normalize_track,
+    pages_for_offsets,
+    reservoir_sample,
+    sample_offsets,
+)
+
+
+def test_sample_offsets_distinct_and_in_range():
+    offsets = sample_offsets(500, 30, rng=random.Random(1))
+    assert len(offsets) == 30
+    assert len(set(offsets)) == 30
+    assert all(0 <= o < 500 for o in offsets)
+
+def test_sample_offsets_small_total():
+    assert sorted(sample_offsets(5, 30)) == [0, 1, 2, 3, 4]
+    assert sample_offsets(0, 30) == []
+
+def test_pages_for_offsets():
+    assert pages_for_offsets([3, 49, 50, 420, 421], 50) == [0, 50, 400]
+
+def test_reservoir_sample_size_and_membership():
+    picked = reservoir_sample(iter(range(1000)), 10, rng=random.Random(2))
+    assert len(picked) == 10
+    assert len(set(picked)) == 10
+    assert all(0 <= p < 1000 for p in picked)
+
+def test_reservoir_sample_shorter_than_k():
+    assert sorted(reservoir_sample(range(3), 10)) == [0, 1, 2]
+    assert reservoir_sample(range(3), 0) == []
+
+def test_normalize_track_shape():
+    track = {
+        "id": "abc",
+        "name": "Song",
+        "artists": [{"name": "A", "id": "1"}, {"name": "B"}, {"name": "C"}],
+        "album": {"name": "Album", "images": [{"url": "x"}], "id": "al"},
+        "uri": "spotify:track:abc",
+    }
+    normalized = normalize_track(track, playlist_source=True)
+    assert normalized["artists"] == [{"name": "A"}, {"name": "B"}]
+    assert normalized["album"] == {"name": "Album", "images": [{"url": "x"}]}
+    assert normalized["popularity"] == 0
+    assert normalized["playlist_source"] is True
+    assert is_playable(track)
+    assert not is_playable(None)
+    assert not is_playable({"name": "local file"})
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUTTLCache(Generic[K, V]):
+    """
+    Caché en memoria con expiración por TTL y desalojo LRU.
+
+    El tamaño se limita por número de entradas y, si se pasa `sizeof`, por
+    bytes aproximados. Cuenta hits, misses y desalojos para exponerlos como
+    métricas.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[V], int]] = None,
+        on_remove: Optional[Callable[[K, V], None]] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        # Se llama (con el lock tomado) cada vez que sale una entrada: desalojo, expiración o reemplazo
+        self._on_remove = on_remove
+        # key -> (valor, expira_en, tamaño)
+        self._data: "OrderedDict[K, Tuple[V, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _pop(self, key: K) -> None:
+        value, _, size = self._data.pop(key)
+        self._bytes -= size
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at, _ = item
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def peek(self, key: K) -> Optional[V]:
+        """
+        Valor vigente sin moverlo en el LRU ni contarlo como hit o miss
+        """
+        item = self._data.get(key)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def set(self, key: K, value: V) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._data):
+                self._pop(key)
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        """
+        Entradas vigentes, de la más reciente a la más antigua (sin contar como hit)
+        """
+        now = time.monotonic()
+        with self._lock:
+            snapshot = list(self._data.items())
+        for key, (value, expires_at, _) in reversed(snapshot):
+            if expires_at > now:
+                yield key, value
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return dict(
+            self._stats,
+            entries=len(self._data),
+            bytes=self._bytes,
+            hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        )
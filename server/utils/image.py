@@ -0,0 +1,248 @@
+import asyncio
+import base64
+import binascii
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, TypeVar
+
+from PIL import Image, ImageOps
+
+from server.core.config import settings
+
+# Pool para decodificar/re-codificar imágenes fuera del event loop (se crea al primer uso)
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PREPROCESS_WORKERS,
+            thread_name_prefix="image"
+        )
+    return _executor
+
+
+T = TypeVar("T")
+
+
+async def run_in_image_pool(func: Callable[..., T], *args) -> T:
+    """
+    Ejecuta trabajo de CPU con imágenes (decodificar, redimensionar, ...) en el pool de imágenes
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+# Formatos aceptados. Rekognition solo admite JPEG y PNG; WebP llega a AWS
+# re-codificado como JPEG por preprocess_image
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+class ImageValidationError(ValueError):
+    """
+    Imagen rechazada por formato, tamaño o contenido. `status_code` es el
+    código HTTP sugerido para la respuesta.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ValidatedImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """
+    Detecta el formato por sus magic bytes, sin decodificar
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def decode_base64_image(image_data: str) -> bytes:
+    """
+    Decodifica una imagen en base64, con o sin prefijo data:image/...;base64,
+    """
+    # Remover el prefijo data:image si existe
+    if image_data.startswith("data:") and "," in image_data:
+        image_data = image_data.split(",", 1)[1]
+    # validate=True: sin él los caracteres fuera del alfabeto se ignoran en
+    # silencio ("!!!!" da b""). Los saltos de línea (Base64 MIME) sí se aceptan.
+    try:
+        return base64.b64decode("".join(image_data.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageValidationError("Formato de imagen inválido (no es Base64).")
+
+
+def validate_image_bytes(data: bytes, max_bytes: Optional[int] = None, max_pixels: Optional[int] = None) -> ValidatedImage:
+    """
+    Valida una imagen leyendo solo la cabecera: formato por magic bytes,
+    tamaño en bytes y dimensiones. No decodifica los píxeles, así que los
+    mismos bytes se pueden pasar tal cual al preprocesado o a Rekognition.
+    """
+    max_bytes = max_bytes or settings.IMAGE_MAX_BYTES
+    max_pixels = max_pixels or settings.IMAGE_MAX_PIXELS
+
+    if not data:
+        raise ImageValidationError("No se proporcionó ninguna imagen")
+
+    if len(data) > max_bytes:
+        raise ImageValidationError(
+            f"La imagen excede el tamaño máximo de {max_bytes // (1024 * 1024)} MB",
+            status_code=413
+        )
+
+    image_format = sniff_image_format(data)
+    if image_format is None:
+        raise ImageValidationError("Formato de imagen inválido. Use JPEG, PNG o WebP.")
+
+    try:
+        # Image.open es perezoso: solo lee la cabecera
+        with Image.open(io.BytesIO(data), formats=[image_format]) as img:
+            width, height = img.size
+    except Exception:
+        raise ImageValidationError("Archivo de imagen corrupto o inválido")
+
+    if width * height > max_pixels:
+        raise ImageValidationError(
+            f"La imagen es demasiado grande ({width}x{height})",
+            status_code=413
+        )
+
+    return ValidatedImage(data=data, format=image_format, width=width, height=height)
+
+
+async def read_upload(upload, max_bytes: Optional[int] = None, chunk_size: int = 64 * 1024) -> bytes:
+    """
+    Lee un UploadFile por bloques y corta en cuanto supera `max_bytes`,
+    sin cargar en memoria más de lo permitido
+    """
+    max_bytes = max_bytes or settings.IMAGE_MAX_BYTES
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise ImageValidationError(
+                f"La imagen excede el tamaño máximo de {max_bytes // (1024 * 1024)} MB",
+                status_code=413
+            )
+    return bytes(buffer)
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    original_size: int
+    width: int
+    height: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.data)
+
+
+def preprocess_image(
+    image_bytes: bytes,
+    max_edge: Optional[int] = None,
+    quality: Optional[int] = None,
+    crop: Optional[Tuple[float, float, float, float]] = None
+) -> PreprocessedImage:
+    """
+    Prepara una imagen para Rekognition: la orienta según EXIF, opcionalmente
+    la recorta a `crop` (left, top, right, bottom en fracciones 0..1), la
+    reduce a `max_edge` px en su lado mayor y la re-codifica como JPEG sin
+    metadatos.
+    """
+    max_edge = max_edge or settings.IMAGE_MAX_EDGE
+    quality = quality or settings.IMAGE_JPEG_QUALITY
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # En JPEG el decodificador puede reducir por DCT antes de decodificar todo.
+        # Con recorte, el lado que importa es el del recorte, no el de la imagen
+        if crop is None:
+            img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+        if crop is not None:
+            width, height = img.size
+            left, top, right, bottom = crop
+            img = img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        # Sin exif=... el JPEG resultante no lleva metadatos
+        img.save(output, format="JPEG", quality=quality, optimize=True)
+        width, height = img.size
+
+    return PreprocessedImage(
+        data=output.getvalue(),
+        original_size=len(image_bytes),
+        width=width,
+        height=height
+    )
+
+
+async def preprocess_image_async(
+    image_bytes: bytes,
+    max_edge: Optional[int] = None,
+    quality: Optional[int] = None,
+    crop: Optional[Tuple[float, float, float, float]] = None
+) -> PreprocessedImage:
+    """
+    preprocess_image ejecutado en el pool de imágenes
+    """
+    return await run_in_image_pool(preprocess_image, image_bytes, max_edge, quality, crop)
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    Hash perceptual por diferencias (dHash) de `hash_size`² bits. Imágenes
+    casi idénticas (re-encodadas, reescaladas) dan hashes a poca distancia
+    de Hamming.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        img = ImageOps.exif_transpose(img)
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = small.tobytes()
+
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+async def dhash_async(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    dhash ejecutado en el pool de imágenes
+    """
+    return await run_in_image_pool(dhash, image_bytes, hash_size)
+
+
+def shutdown() -> None:
+    # El próximo uso (otro lifespan en el mismo proceso) crea un pool nuevo
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None